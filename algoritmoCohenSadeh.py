@@ -9,6 +9,7 @@ import collections
 import namedlist
 
 import graph
+import profiling
 import pert
 import fileFormats
 import validation
@@ -37,6 +38,7 @@ def cohen_sadeh(prelations):
     end_act = graph.ending_activities(successors)
 
     #Step 1. Construct work table with Immediate Predecessors
+    profiling.step('Step 1')
     Columns = namedlist.namedlist('Columns', ['pre', 'blocked', 'dummy', 'suc', 'start_node', 'end_node'])
                             # [0 Predecesors,   1 Blocked, 2 Dummy, 3 Successors, 4 Start node, 5 End node]
                             #   Blocked = (False or Activity with same precedents)
@@ -48,6 +50,7 @@ def cohen_sadeh(prelations):
 #    __print_work_table(work_table)
 
     #Step 2. Identify Identical Precedence Constraint of Diferent Activities
+    profiling.step('Step 2')
     visited_pred = {}
     for act, columns in work_table.items():
         pred = frozenset(columns.pre)
@@ -61,6 +64,7 @@ def cohen_sadeh(prelations):
 
 
     #Step 3. Identify Necessary Dummy Arcs
+    profiling.step('Step 3.1')
     dups = set()
     visited_act = set()
     for columns in work_table.values():
@@ -75,6 +79,7 @@ def cohen_sadeh(prelations):
 
 
     #Step 3.2, 3.3 and 4. Create rows and information for Dummy Arcs
+    profiling.step('Step 3.2-4')
     dummy_counter = collections.Counter()
     for _, columns in work_table.items():
         # Avoid blocked
@@ -94,6 +99,7 @@ def cohen_sadeh(prelations):
 
 
     #Step 5. Creating nodes
+    profiling.step('Step 5')
     node = 0 # instead of 0, can start at 100 to avoid confusion with activities named with numbers when debugging
     for act, columns in work_table.items():
         if not columns.dummy and not columns.blocked:
@@ -112,6 +118,7 @@ def cohen_sadeh(prelations):
 
 
     #Step 6. Associate activities with their end nodes
+    profiling.step('Step 6')
     # (a) find one non-dummy successor for each activity
     for act, columns in work_table.items():
         for suc, suc_columns in work_table.items():
@@ -143,6 +150,7 @@ def cohen_sadeh(prelations):
 
 
     #Step 7. Associate dummy arcs with start nodes
+    profiling.step('Step 7')
     for act, columns in work_table.items():
         if columns.dummy:
             pred = iter(columns.pre).next()
@@ -154,6 +162,7 @@ def cohen_sadeh(prelations):
 
 
     #Step 8. Generate the graph
+    profiling.step('Step 8')
     pm_graph = pert.PertMultigraph()
     for act, columns in work_table.items():
         _, _, dummy, _, start, end = columns
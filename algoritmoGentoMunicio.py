@@ -6,7 +6,7 @@ Algorithm to draw Graph PERT based on algorithm from Gento-Municio
 Copyright 2007-15 University of Cordoba (Spain)
 """
 
-import scipy
+import scipy.sparse
 import numpy
 import collections
 import itertools
@@ -14,6 +14,7 @@ import itertools
 import graph
 import pert
 import Kahn1962
+import profiling
 
 class NodeList(object):
     """List of nodes for each activity to create PERT graph"""
@@ -75,67 +76,77 @@ def gento_municio(predecessors):
         Gento-Municio, Angel M. “Un Algoritmo Para La Realización de Grafos Con Las Actividades En Los Arcos, Grafos
         PERT.” Cuadernos Del CIMBAGE, no. 7 (2004): 103.
     """
+    profiling.step('Matrix')
     nodes = NodeList(predecessors.keys())
     successors = graph.reversed_prelation_table(predecessors)
+    n = nodes.num_real_activities
 
-    # Generate precedences/successors matrix
-    matrix = scipy.zeros([nodes.num_real_activities, nodes.num_real_activities], dtype=int)
+    # Generate sparse precedences/successors matrix (rows: activities, columns: successors)
+    index = dict((name, i) for i, name in enumerate(nodes.activity_names))
+    links = set()
     for activity, successor in successors.items():
         for suc in successor:
-            matrix[nodes.activity_names.index(activity)][nodes.activity_names.index(suc)] = 1
-#    print "MATRIX filled: \n", matrix
+            links.add( (index[activity], index[suc]) )
+    rows = numpy.array([i for i, j in links], dtype=int)
+    columns = numpy.array([j for i, j in links], dtype=int)
+    matrix = scipy.sparse.csr_matrix((numpy.ones(len(links), dtype=int), (rows, columns)), shape=(n, n))
+    matrix.sort_indices()
+    matrix_csc = matrix.tocsc()
+    matrix_csc.sort_indices()
     # sum each column
-    sum_predecessors = scipy.sum(matrix, axis=0)
-#    print "SUM_PREDECESSORS: ", sum_predecessors
+    sum_predecessors = numpy.bincount(columns, minlength=n)
     # sum each row
-    sum_successors = scipy.sum(matrix, axis=1)
-#    print "SUM_SUCCCESSORS: ", sum_successors
+    sum_successors = numpy.bincount(rows, minlength=n)
+    # number of predecessors of all the successors of each activity
+    sum_predecessors_successors = matrix.dot(sum_predecessors)
 
+    def successor_indexes(act):
+        """Indexes of the successors of an activity in ascending order"""
+        return matrix.indices[matrix.indptr[act]:matrix.indptr[act+1]].tolist()
 
+
+    profiling.step('Step 1')
     # Step 1. Search initial activities (have no predecessors) [3.1]
     beginning, = numpy.nonzero(sum_predecessors == 0)
-#    print "Beginning: ", beginning
 
     # add begin node to activities that begin at initial node
     begin_node = nodes.next_node()
     for node_activity in beginning:
         nodes[node_activity][0] = begin_node
 
+    profiling.step('Step 2')
     # Step 2. Search endings activities (have no successors) [3.2]
     ending, = numpy.nonzero(sum_successors == 0)
-#    print "Ending: ", ending
     # add end node to activities that end in final node
     # note: this step may be replaced by handling them in steps 3 and 4 as stI and stII
     end_node = nodes.next_node()
     for node_activity in ending:
         nodes[node_activity][1] = end_node
-#    print nodes
 
+    profiling.step('Step 3')
     # Step 3. Search standard type I (Activity have unique successors) [3.3]
     act_one_predeccessor, = numpy.nonzero(sum_predecessors == 1)
     stI = collections.defaultdict(list)
-    for i in act_one_predeccessor:
-        pred = numpy.nonzero((matrix[:,i]))[0][0]
+    for i in act_one_predeccessor.tolist():
+        pred = int(matrix_csc.indices[matrix_csc.indptr[i]])
         if (sum_successors[pred] == 1 # this condition is redundant but faster than the following check
-            or sum_successors[pred] == scipy.sum(matrix[:,numpy.nonzero(matrix[pred])])):
+            or sum_successors[pred] == sum_predecessors_successors[pred]):
             stI[pred].append(i)
-#    print "stI: ", stI
     #Add the same end node of activities to the begin node of its successors activities
     for node_activity in stI:
         stI_node = nodes.next_node()
         nodes[node_activity][1] = stI_node
         for successor in stI[node_activity]:
             nodes[successor][0] = stI_node
-#    print nodes
 
 
+    profiling.step('Step 4')
     #Step 4. Search standard II(Full) and standard II(Incomplete) [3.4]
-#    print "--- Step 4 ---"
     # dictionary with key: equal successors; value: mother activities
     stII = collections.defaultdict(list)
 
-    for act in range(nodes.num_real_activities):
-        stII[frozenset(matrix[act].nonzero()[0])].append(act)
+    for act in range(n):
+        stII[frozenset(successor_indexes(act))].append(act)
 
     # remove ending activities and those included in type I
     del(stII[ frozenset([]) ])
@@ -147,9 +158,7 @@ def gento_municio(predecessors):
     for succs, preds in stII.items():
         u = len(preds)
         # if NP[succs] != u (complete)
-#        print preds, '->', succs,
         if not [ i for i in succs if sum_predecessors[i] != u ]:
-#            print 'complete'
             mark_complete.append(succs)
             node = nodes.next_node()
             for act in preds:
@@ -157,64 +166,58 @@ def gento_municio(predecessors):
             for act in succs:
                 nodes[act][0] = node
         else: # (incomplete)
-#            print 'incomplete'
             node = nodes.next_node()
             for act in preds:
                 nodes[act][1] = node
-#    print nodes
 
+    profiling.step('Step 5')
     # Step 5. Search for matching successors [3.5]
-#    print "--- Step 5 ---"
     # remove type II complete so that stII becomes MASC
     for succs in mark_complete:
         del stII[succs]
     masc = stII
 
-#    print "MASC"
-#    for succs, preds in stII.items():
-#        print preds, succs
 
-    npc = scipy.zeros([nodes.num_real_activities], dtype=int)
+    npc = numpy.zeros([n], dtype=int)
     for succs, preds in masc.items():
         num_preds = len(preds)
         for succ in succs:
             npc[succ] += num_preds
-#    print npc
 
+    profiling.step('Step 6')
     # Step 6. Identifying start nodes on matching successors
-#    print "--- Step 6 ---"
-    act_no_initial = [i for i in range(nodes.num_real_activities) if nodes[i][0] == None]
-#    print act_no_initial, "<- No initial node"
-    num_no_initial = len(act_no_initial)
+    act_no_initial = [i for i in range(n) if nodes[i][0] == None]
+    position = dict((act, i) for i, act in enumerate(act_no_initial))
 
-    mra = scipy.zeros([num_no_initial, num_no_initial], dtype=int)
+    # MRA as a sparse {(i, j) : predecessors in common}
+    mra = collections.defaultdict(int)
     for succs, preds in masc.items():
         num_preds = len(preds)
         for act_i, act_j in itertools.combinations(succs, 2):
-            mra[act_no_initial.index(act_i), act_no_initial.index(act_j)] += num_preds
-            mra[act_no_initial.index(act_j), act_no_initial.index(act_i)] += num_preds # Symmetry, any succ order
-#    print 'MRA'
-#    print mra
-
-    # check matching successors and assign them initial nodes
-    for i in range(num_no_initial):
-        for j in range(i+1, num_no_initial):
-            if mra[i,j] == npc[act_no_initial[i]] and mra[i,j] == npc[act_no_initial[j]]:
-#                print 'coincidencia', i, j, "(", act_no_initial[i], act_no_initial[j], ")"
-                if nodes[act_no_initial[i]][0] != None:
-                    node = nodes[act_no_initial[i]][0]
-                else:
-                    node = nodes.next_node()
-                    nodes[act_no_initial[i]][0] = node
-                nodes[act_no_initial[j]][0] = node
+            mra[position[act_i], position[act_j]] += num_preds
+            mra[position[act_j], position[act_i]] += num_preds # Symmetry, any succ order
+
+    # check matching successors (only pairs with predecessors in common may
+    # match, except activities without them) in order and assign them initial nodes
+    matching = [(i, j) for (i, j), count in mra.items()
+                if i < j and count == npc[act_no_initial[i]] and count == npc[act_no_initial[j]]]
+    without_npc = [i for i, act in enumerate(act_no_initial) if npc[act] == 0]
+    matching += list(itertools.combinations(without_npc, 2))
+    for i, j in sorted(matching):
+        if nodes[act_no_initial[i]][0] != None:
+            node = nodes[act_no_initial[i]][0]
+        else:
+            node = nodes.next_node()
+            nodes[act_no_initial[i]][0] = node
+        nodes[act_no_initial[j]][0] = node
 
     # assign initial node to the remaining activities (they must be alone, interpreted, not clear on paper)
     for node in nodes:
         if node[0] == None:
             node[0] = nodes.next_node()
 
-#    print nodes
 
+    profiling.step('Step 7')
     # Step 7. String search
     # create MNS (to avoid counting matching successors twice)
     mns = {}
@@ -224,64 +227,55 @@ def gento_municio(predecessors):
         mns[ nodes[preds[0]][1] ] = succ_nodes  # as all preds have same successors they will be usign just one node
         unconnected.update(succ_nodes)
 
-#    print 'MNS'
-#    for pred, succs in mns.items():
-#        print pred, '-', succs
 
-    # create MRN
+    # create MRN (sparse, as {i : {j : times i and j appear together}})
     unconnected = list(unconnected)
     num_unconnected = len(unconnected)
-#    print unconnected, '<-Unconnected'
+    position = dict((node, i) for i, node in enumerate(unconnected))
 
-    appear = scipy.zeros([num_unconnected], dtype=int)
-    mrn = scipy.zeros([num_unconnected, num_unconnected], dtype=int)
+    appear = numpy.zeros([num_unconnected], dtype=int)
+    mrn = [collections.defaultdict(int) for i in range(num_unconnected)]
     for pred, u_nodes in mns.items():
         for node in u_nodes:
-            appear[ unconnected.index(node) ] += 1
+            appear[ position[node] ] += 1
         for node_a, node_b in itertools.combinations(u_nodes, 2):
-            mrn[unconnected.index(node_a), unconnected.index(node_b)] += 1
-            mrn[unconnected.index(node_b), unconnected.index(node_a)] += 1
-#    print 'MRN'
-#    print mrn
-#    print 'Appear'
-#    print appear
-
-    # create MC
+            mrn[position[node_a]][position[node_b]] += 1
+            mrn[position[node_b]][position[node_a]] += 1
+
+    # create MC (every node appears at least once, so j must appear with i)
     mc = []
     for i in range(num_unconnected):
-        mc.append([j for j in range(num_unconnected) if mrn[i,j] == appear[i] ])
+        mc.append(sorted([j for j, count in mrn[i].items() if count == appear[i] ]))
 
-#    print 'MC'
-#    for i in range(num_unconnected):
-#        print i, '-', mc[i]
 
     # use strings to connect nodes
     for i in range(num_unconnected):
         following_nodes = sorted(mc[i], key=lambda x : len(mc[x]))
         while following_nodes:
-#            print following_nodes
             follower = following_nodes.pop()
-#            print 'extracted:', follower
 
             # Create dummy i -> follower (unconnected to real)
             nodes.append_dummy(unconnected[i], unconnected[follower])
             for fol_follower in mc[follower]:
-#                print 'remove:', fol_follower
                 try:
                     following_nodes.remove(fol_follower)
                 except ValueError:
                     pass # if it has already been connected, it will not be in list now
-#    print nodes
 
+    profiling.step('Step 8')
     # Step 8. Final nodes and dummies
     # (note: contrary to what paper says, we have already set final nodes for all
     #  activities in step 4 as indicated in figure 8. Nevertheless, these nodes are
     #  unconnected so we replace them here if necessary. Not assigning nodes in step 4
     #  would break step 7)
+    # masc rows containing each activity
+    masc_with = collections.defaultdict(list)
+    for succs in masc:
+        for succ in succs:
+            masc_with[succ].append(succs)
+
     for succs, preds in masc.items():
-#        print "Studying:", preds, '->', succs
         if len(succs) == 1: # Case I
-#            print "Case I"
             for pred in preds:
                 nodes[pred][1] = nodes[next(iter(succs))][0]
         else:
@@ -292,16 +286,14 @@ def gento_municio(predecessors):
                 if min_npc == None or min_npc > npc[succ]:
                     min_follower = succ
                     min_npc = npc[succ]
-#            print min_follower, 'npc:', min_npc
 
             # Count the number of masc rows containing our successor activities
             count = 0
-            for others in masc:
+            for others in masc_with[min_follower]:
                 if succs.issubset(others):
                     count += len(masc[others])
 
             if count >= min_npc: # Case II (if min_npc==1) and Case III
-#                print "Case II or III"
                 for pred in preds:
                     nodes[pred][1] = nodes[min_follower][0]
             else:
@@ -312,6 +304,7 @@ def gento_municio(predecessors):
     # Step 9. Final nodes for type II incomplete
     # (note: final nodes have already been assigned in step 8. We think section 3.9 of paper is unnecessary)
     
+    profiling.step('Renumber')
     return nodes.to_pert_graph().renumerar()
 
 
@@ -9,6 +9,7 @@ import fileFormats
 import validation
 import pert
 import graph
+import profiling
 import mouhoubRules
 
 
@@ -36,6 +37,7 @@ def mouhoub(prelations):
     # STEPS TO BUILD THE PERT GRAPH
     
     #Step 1. Save the prelations in the work table
+    profiling.step('Step 1')
     complete_bipartite = graph.successors2precedents(Zconf(successors))
     
     
@@ -47,6 +49,7 @@ def mouhoub(prelations):
           
           
     #Step 2. Identify Identical Precedence Constraint of Diferent Activities
+    profiling.step('Step 2')
     visited_pred = {}
     for act, columns in work_table.items():
         pred = frozenset(columns.pre)
@@ -57,6 +60,7 @@ def mouhoub(prelations):
                    
             
     #Step 3. Creating nodes
+    profiling.step('Step 3')
     # (a) Find start nodes
     node = 0 # instead of 0, can start at 100 to avoid confusion with activities named with numbers when debugging
     for act, columns in work_table.items():
@@ -92,6 +96,7 @@ def mouhoub(prelations):
 
 
     #Step 4. MOUHOUB algorithm rules to remove extra dummy activities
+    profiling.step('Step 4')
     
     mouhoubRules.rule_1(successors_copy, work_table)
     
@@ -114,6 +119,7 @@ def mouhoub(prelations):
 
                    
     #Step 6. Generate the graph
+    profiling.step('Step 6')
     pm_graph = pert.PertMultigraph()
     for act, columns in work_table_final.items():
         _, _, _, dummy, _, start, end, _ = columns
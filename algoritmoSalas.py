@@ -8,6 +8,7 @@ Copyright 2007-15 University of Cordoba (Spain)
 
 import pert
 import graph
+import profiling
 
 
 def salas(prelations):
@@ -17,6 +18,7 @@ def salas(prelations):
     prelations = {'Act': ['Predecessor1','Predecessor2'], ... }
     """
     
+    profiling.step('Matrix')
     matrix,premat = create_matrix(prelations)
     m, t, af, ai, ami, amiD, amf, amfD = previous(matrix)
 
@@ -30,6 +32,7 @@ def salas(prelations):
 
 
     # Initialize a dictionary of activities
+    profiling.step('Nodes')
     cont = 1                    
     for i in ai:            
         cont = cont + 1
@@ -207,10 +210,12 @@ def salas(prelations):
         if X == b:
             X = 0
     
+    profiling.step('Settings')
     d2 = d1.copy()
     d2 = settings(d1, cont, a, af, b)
     
     # Build graph
+    profiling.step('Build graph')
 
     graph = pert.Pert()
 
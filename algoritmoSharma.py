@@ -7,6 +7,7 @@ Copyright 2007-15 University of Cordoba (Spain)
 """
 import pert
 import graph
+import profiling
 
 def sharma1998ext(precedents):
     """
@@ -14,6 +15,7 @@ def sharma1998ext(precedents):
     Algorithm sharma1998 extended
     returns: pert.Pert() graph data structure
     """
+    profiling.step('Close graph')
     pert_graph = pert.Pert()
     successors = graph.reversed_prelation_table(precedents)  
 
@@ -43,6 +45,7 @@ def sharma1998ext(precedents):
             pert_graph.addActivity("seDummy", d, dest, dummy=True)
 
     # Sharma1998 algorithm
+    profiling.step('Sharma1998')
     for act in successors:
         #print "Processing", act, pert_graph
         #window.images.append( graph.pert2image(pert_graph) )
@@ -61,5 +64,6 @@ def sharma1998ext(precedents):
                 pert_graph.makePrelation(pre, act)
                 a_origin, a_dest = pert_graph.activityArc(act)
                 
+    profiling.step('Renumber')
     return pert_graph.renumerar()
 
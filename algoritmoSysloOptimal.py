@@ -7,6 +7,7 @@ import fileFormats
 import namedlist
 
 import graph
+import profiling
 import pert
 import validation
 import syslo_table
@@ -32,11 +33,13 @@ def sysloOptimal(prelations):
 
     
     #Step 0.
+    profiling.step('Step 0')
     grafo = {}
     alt = graph.successors2precedents(successors)
     grafo = graph.successors2precedents(syslo_table.syslo(prela, grafo, alt))
 
     #Step 1. Save the new prelation table in a work table
+    profiling.step('Step 1')
     work_table = {}
     for act, pre in grafo.items():
         if not act in prelations:
@@ -46,6 +49,7 @@ def sysloOptimal(prelations):
 
 
     #Step 2. Identify Dummy Activities And Identical Precedence Constraint of Diferent Activities
+    profiling.step('Step 2')
     visited_pred = {}
     for act, columns in work_table.items():
         pred = frozenset(columns.pre)
@@ -56,6 +60,7 @@ def sysloOptimal(prelations):
 
 
     #Step 3. Creating nodes
+    profiling.step('Step 3')
     # (a) find start nodes
     node = 0 # instead of 0, can start at 100 to avoid confusion with activities named with numbers when debugging
     for act, columns in work_table.items():
@@ -90,6 +95,7 @@ def sysloOptimal(prelations):
                 node += 1
     
     # Step 4. Remove redundancy of dummy activities
+    profiling.step('Step 4')
     vis = []
     for act, columns in work_table.items():
         if columns.dummy == False:
@@ -103,6 +109,7 @@ def sysloOptimal(prelations):
                      
     
     #Step 5. Generate the graph
+    profiling.step('Step 5')
     pm_graph = pert.PertMultigraph()
     for act, columns in work_table.items():
         _, _, dummy, _, start, end = columns
@@ -3,9 +3,12 @@ Algorithm to draw Graph PERT based on method of Syslo (Polynomial time)
 
 """
 
+import collections
+
 import namedlist
 
 import graph
+import profiling
 import pert
 import fileFormats
 import validation
@@ -20,43 +23,66 @@ def sysloPolynomial(prelations):
     end_act = graph.ending_activities(successors)
 
     #Step 0. Construct work table with Immediate Predecessors
+    profiling.step('Step 0')
     Columns = namedlist.namedlist('Columns', ['pre', 'blocked', 'dummy', 'suc', 'start_node', 'end_node'])
                             # [0 Predecesors,   1 Blocked, 2 Dummy, 3 Successors, 4 Start node, 5 End node]
                             #   Blocked = (False or Activity with same precedents)
 
 
     #Step 1. Create the improper covers
+    profiling.step('Step 1')
     work_table_pol = makeCover(prelations, successors)
           
    
     # Step 2. Syslo Polynomial algorithm
+    profiling.step('Step 2')
     final = successors.copy()
-    visited = []
+    visited = set()
+
+    # Index of the improper cover table: last row with each activity in 'w'
+    # and rows with each activity in 'u'
+    cover_w = {}
+    rows_with = {}
+    for key, value in work_table_pol.items():
+        for a in value.w:
+            cover_w[a] = value.w
+        for a in set(value.u):
+            rows_with.setdefault(a, []).append(key)
+    row_order = dict((key, n) for n, key in enumerate(work_table_pol))
        
     for act, pred in prelations.items():
+        # Rows whose activities are all predecessors of act (in table order)
+        rows = None
         for v in pred:
             for u in pred:
                 if u != v and successors[v] != successors[u] and act not in visited:
                     # Find activity in the improper cover table
-                    for key, value in work_table_pol.items():
-                        if act in value.w:
-                            w = value.w
+                    if act in cover_w:
+                        w = cover_w[act]
                           
+                    if rows is None:
+                        found = collections.defaultdict(int)
+                        for a in set(prelations[act]):
+                            for key in rows_with.get(a, []):
+                                found[key] += 1
+                        rows = sorted([key for key, n in found.items() 
+                                       if n == len(set(work_table_pol[key].u))], 
+                                      key = row_order.get)
+
                     # Find each row that belongs to the predecessors of activity
-                    for key, value in work_table_pol.items():
-                        if set(value.u).issubset(prelations[act]) and value.u:
-                            vertex = set(value.u).pop()
-                            # Compare successors of a row with the improper cover of the activity
-                            if successors[vertex] != w:
-                                for q in value.u: 
-                                    if final.has_key(q):
-                                        final[q] = list((set(final[q]) - set(w) | set([str(vertex) + separator + str(act)])) - set([act]))       
-                                    else:
-                                        final[q] = list(set(successors[q]) - set(w) | set([str(vertex) + separator + str(act)]))
-                                final[str(vertex) + separator + str(act)] = [act]
-
-                                for l in w:
-                                    visited.append(l)
+                    for key in rows:
+                        value = work_table_pol[key]
+                        vertex = set(value.u).pop()
+                        # Compare successors of a row with the improper cover of the activity
+                        if successors[vertex] != w:
+                            for q in value.u: 
+                                if final.has_key(q):
+                                    final[q] = list((set(final[q]) - set(w) | set([str(vertex) + separator + str(act)])) - set([act]))       
+                                else:
+                                    final[q] = list(set(successors[q]) - set(w) | set([str(vertex) + separator + str(act)]))
+                            final[str(vertex) + separator + str(act)] = [act]
+
+                            visited.update(w)
  
         
     final = graph.successors2precedents(final)
@@ -69,6 +95,7 @@ def sysloPolynomial(prelations):
 
 
     #Step 3. Identify Dummy Activities And Identical Precedence Constraint of Diferent Activities
+    profiling.step('Step 3')
     visited_pred = {}
     for act, columns in work_table.items():
         pred = frozenset(columns.pre)
@@ -79,7 +106,15 @@ def sysloPolynomial(prelations):
 
 
     #Step 4. Creating nodes
+    profiling.step('Step 4')
     # (a) find start nodes
+    # First activity not blocked (in table order) succeeding each activity
+    first_suc = {}
+    for suc, suc_columns in work_table.items():
+        if not suc_columns.blocked:
+            for a in suc_columns.pre:
+                first_suc.setdefault(a, suc)
+
     node = 0 # instead of 0, can start at 100 to avoid confusion with activities named with numbers when debugging
     for act, columns in work_table.items():
         if not columns.blocked:
@@ -89,11 +124,8 @@ def sysloPolynomial(prelations):
             columns.start_node = work_table[columns.blocked].start_node
             
         # Associate activities with their end nodes
-        for suc, suc_columns in work_table.items():
-            if not suc_columns.blocked:
-                if act in suc_columns.pre:
-                    columns.suc = suc
-                    break
+        if act in first_suc:
+            columns.suc = first_suc[act]
 
 
     
@@ -140,15 +172,17 @@ def makeCover(prelations, successors):
     work_table_imp = {}
     i = 0
     
+    same_successors = {} # tuple of successors: activities with those successors
+    for act, columns in successors.items():
+        same_successors.setdefault(tuple(columns), []).append(act)
+
     for act, columns in successors.items():
         u = set()
         pred = frozenset(columns)
         if pred not in visited_suc:
             visited_suc[pred] = act
             u.add(act)
-            for act2, columns2 in successors.items():
-                if columns2 == columns:
-                    u.add(act2)
+            u.update(same_successors[tuple(columns)])
                     
         if u:
             work_table_imp[i] = MinRev(list(u), [])
@@ -165,9 +199,6 @@ def makeCover(prelations, successors):
         if pred not in visited_pred:
             visited_pred[pred] = act
             u.add(act)
-            for act2 in prelations:
-                if pred == columns:
-                    u.add(act2)
                     
         if u:
             if work_table_imp.has_key(i):
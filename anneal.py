@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Batch simulated annealing of project files (without the graphical interface)
+
+Each project file (PSPLIB .sm or .ppc) is loaded and its resources are
+allocated or leveled with simulated annealing (see simAnnealing.multi_start)
+by a process of a pool. For each file it records:
+    - makespan of the best schedule found
+    - variance of the resource loads of that schedule (mean of the
+      variances of the renewable and double constrained resources)
+    - iterations, alpha and initial temperature of the best chain
+    - wall time of the annealing (seconds)
+
+Results are appended to a CSV table (one row per file) by the main process
+only, in the order of the files:
+
+    python anneal.py examples/Elmaghraby -t allocation.csv
+    python anneal.py j30 j60 -l --nu 0.8 --phi 0.95 -s 1 -t leveling.csv
+
+ Copyright 2007-15 Universidad de Córdoba
+ This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published
+   by the Free Software Foundation, either version 3 of the License,
+   or (at your option) any later version.
+ This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+ You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import os.path
+import sys
+import time
+import csv
+import argparse
+import multiprocessing
+
+import fileFormats
+import simAnnealing
+from benchmark import project_files
+
+# Columns of the results table
+FIELDS = ['file', 'mode', 'activities', 'resources', 'status', 'makespan', 'variance',
+          'iterations', 'alpha', 'temperature', 'seconds', 'chains', 'seed', 'error']
+
+
+def anneal_project(infile, leveling, nu, phi, minTemperature, maxIteration, numIterations,
+                   slack=0, chains=1, seed=None):
+    """
+    Allocates or levels the resources of a project file with simulated annealing
+
+    Parameters: infile (project file name, .ppc or .sm)
+                leveling (if 0 it will allocate else it will level)
+                nu, phi, minTemperature, maxIteration, numIterations
+                    (parameters of simAnnealing.simulated_annealing)
+                slack (time added to the last start times)
+                chains (number of annealing chains, run in this process)
+                seed (master seed of the chains)
+
+    Returned value: row (dictionary with the columns of the results table
+                    except file, mode, chains and seed)
+    """
+    formats = [fileFormats.PPCProjectFileFormat(), fileFormats.PSPProjectFileFormat()]
+    data = fileFormats.load_with_some_format(infile, formats)
+    if not data:
+        raise fileFormats.InvalidFileFormatException()
+    actividad, schedules, recurso, asignacion = data
+    for a in actividad:
+        if a[6] == '':
+            raise Exception('Activity ' + a[1] + ' has no average duration')
+
+    resources = simAnnealing.resources_availability(recurso)
+    if leveling == 1 and resources == {}:
+        raise Exception('There are not renewable or double constrained resources')
+    asignation = simAnnealing.resources_per_activities(asignacion, resources)
+    successors = dict(((act[1], act[2]) for act in actividad))
+    activities = simAnnealing.activities_last_time(actividad, slack)
+
+    row = {'activities': len(actividad), 'resources': len(resources)}
+    iwall = time.time()
+    result, statistics = simAnnealing.multi_start(asignation, resources, successors, activities, leveling,
+                                                  nu, phi, minTemperature, maxIteration, numIterations,
+                                                  chains, 1, seed)
+    row['seconds'] = time.time() - iwall
+
+    schedule, evaluated, duration, alpha, tempAux, it = result
+    if schedule is None:
+        row['status'] = 'error'
+        row['error'] = 'Initial temperature not high enough'
+        return row
+
+    row['status'] = 'ok'
+    row['makespan'] = duration
+    if leveling == 1:
+        row['variance'] = evaluated
+    elif resources:
+        row['variance'] = simAnnealing.evaluate(schedule, 1, asignation, resources)[0]
+    row['iterations'] = it
+    row['alpha'] = alpha
+    row['temperature'] = tempAux
+    return row
+
+
+def anneal_job(job):
+    """
+    Anneals a project file of a batch (run by each worker process)
+
+    job (tuple with: project file name, leveling and the remaining
+         arguments of anneal_project)
+
+    return: (project file name, row of the results table)
+    """
+    infile = job[0]
+    try:
+        row = anneal_project(*job)
+    except fileFormats.InvalidFileFormatException:
+        row = {'status': 'error', 'error': 'Unexpected format for file'}
+    except IOError:
+        row = {'status': 'error', 'error': 'Reading project file'}
+    except Exception, e:
+        row = {'status': 'error', 'error': repr(e)}
+    return infile, row
+
+
+def main(argv=None):
+    """
+    Anneals all the project files given (see module documentation)
+
+    The program shall receive the following parameters for each console:
+        projects (project files, folders with project files or glob patterns)
+        -t (name of the file to append results, default: anneal.csv)
+        -l (level the resources instead of allocating them)
+        -c (number of annealing chains of each file)
+        -w (number of worker processes, default: number of CPUs)
+        -s (master seed of the chains of each file)
+        --nu, --phi, --min-temperature, --max-iteration, --no-improve, --slack
+           (parameters of the algorithm, as in the simulated annealing window)
+    """
+    # Parse arguments and options
+    parser = argparse.ArgumentParser(description='Batch simulated annealing of project files')
+    parser.add_argument('projects', nargs='+',
+                        help='Project files, folders with project files or glob patterns')
+    parser.add_argument('--table-file', '-t', default='anneal.csv',
+                        help='Name of file to append results in CSV format (default: anneal.csv)')
+    parser.add_argument('--leveling', '-l', action='store_true',
+                        help='Level the resources (default: allocate them)')
+    parser.add_argument('--chains', '-c', default=1, type=int,
+                        help='Number of annealing chains of each file (default: 1)')
+    parser.add_argument('--workers', '-w', default=multiprocessing.cpu_count(), type=int,
+                        help='Number of processes annealing files (default: number of CPUs)')
+    parser.add_argument('--seed', '-s', default=None, type=int,
+                        help='Master seed of the chains of each file (default: random)')
+    parser.add_argument('--nu', default=0.9, type=float, help='Nu (default: 0.9)')
+    parser.add_argument('--phi', default=0.9, type=float, help='Phi (default: 0.9)')
+    parser.add_argument('--min-temperature', default=0.01, type=float,
+                        help='Minimum temperature (default: 0.01)')
+    parser.add_argument('--max-iteration', default=1000.0, type=float,
+                        help='Maximum number of iterations (default: 1000)')
+    parser.add_argument('--no-improve', default=100, type=int,
+                        help='Iterations without improvement to stop, -1 to never stop (default: 100)')
+    parser.add_argument('--slack', default=0.0, type=float,
+                        help='Slack added to the last start times when leveling (default: 0)')
+    args = parser.parse_args(argv)
+
+    if args.chains < 1 or args.workers < 1:
+        print 'Chains and workers must be > 0'
+        return 1
+
+    files = project_files(args.projects)
+    if not files:
+        print 'ERROR: No project files found'
+        return 1
+
+    write_header = not os.path.isfile(args.table_file)
+    try:
+        f_csv = open(args.table_file, 'ab')
+    except IOError:
+        print 'Can not open table file (%s) to append results in CSV format' % (args.table_file, )
+        return 1
+    writer = csv.DictWriter(f_csv, FIELDS)
+    if write_header:
+        writer.writeheader()
+
+    # Anneal files in parallel and write results from this process
+    leveling = 1 if args.leveling else 0
+    jobs = [(infile, leveling, args.nu, args.phi, args.min_temperature, args.max_iteration,
+             args.no_improve, args.slack, args.chains, args.seed) for infile in files]
+    pool = multiprocessing.Pool(min(args.workers, len(jobs)))
+    errors = 0
+    try:
+        for infile, row in pool.imap(anneal_job, jobs):
+            row['file'] = infile
+            row['mode'] = 'leveling' if leveling else 'allocation'
+            row['chains'] = args.chains
+            row['seed'] = args.seed
+            writer.writerow(row)
+            f_csv.flush()
+            if row['status'] != 'ok':
+                errors += 1
+                print >> sys.stderr, 'ERROR: %s: %s' % (infile, row['error'])
+            else:
+                print '%s %s %s %.3f' % (infile, row['makespan'], row.get('variance'), row['seconds'])
+    finally:
+        pool.close()
+        pool.join()
+        f_csv.close()
+
+    return 1 if errors else 0
+
+# If the program is run directly
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,436 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark of AOA (PERT) graph construction algorithms
+
+Each algorithm is run on each project file (PSPLIB .sm or .ppc) in its own
+worker process, so a run that fails, loops or exhausts memory does not affect
+the others and can be stopped after a timeout. For each run it records:
+    - wall time and CPU time (user + system) of the construction
+    - peak memory (growth of the maximum resident set size of the worker, KB)
+    - number of nodes, arcs, real arcs and dummy arcs of the graph
+    - validation status (see validation.check_validation)
+    - with --profile, time and memory of each step of the algorithm (see profiling)
+
+Results are appended to a CSV table (one row per run) and a summary per
+algorithm is printed. Two tables can be compared to find regressions:
+
+    python benchmark.py run examples/Elmaghraby -a Sharma CohenSadeh -t new.csv
+    python benchmark.py compare old.csv new.csv
+
+ Copyright 2007-15 Universidad de Córdoba
+ This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published
+   by the Free Software Foundation, either version 3 of the License,
+   or (at your option) any later version.
+ This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+ You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import os.path
+import sys
+import time
+import glob
+import csv
+import math
+import resource
+import importlib
+import traceback
+import multiprocessing
+import collections
+import StringIO
+
+import profiling
+
+# Algorithms: name, module and function receiving the prelations table
+# (modules are imported by the workers, so an algorithm with missing
+# dependencies only makes its own runs fail)
+ALGORITHMS = [
+    ('CohenSadeh', 'algoritmoCohenSadeh', 'cohen_sadeh'),
+    ('Sharma', 'algoritmoSharma', 'sharma1998ext'),
+    ('Conjuntos', 'algoritmoConjuntos', 'algoritmoN'),
+    ('GentoMunicio', 'algoritmoGentoMunicio', 'gento_municio'),
+    ('Salas', 'algoritmoSalas', 'salas'),
+    ('Mouhoub', 'algoritmoMouhoub', 'mouhoub'),
+    ('SysloPolynomial', 'algoritmoSysloPolynomial', 'sysloPolynomial'),
+    ('SysloOptimal', 'algoritmoSysloOptimal', 'sysloOptimal'),
+]
+
+# Columns of the results table
+FIELDS = ['file', 'algorithm', 'repetition', 'activities', 'prelations', 'status',
+          'wall_time', 'cpu_time', 'peak_memory_kb', 'nodes', 'arcs', 'real_arcs',
+          'dummy_arcs', 'error', 'steps']
+
+# Extensions of project files searched in folders
+EXTENSIONS = ['.sm', '.ppc']
+
+
+def project_files(paths):
+    """
+    Project files given by file names, folders (searched recursively) or glob patterns
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = []
+            for folder, subfolders, names in os.walk(path):
+                found += [os.path.join(folder, name) for name in names
+                          if os.path.splitext(name)[1] in EXTENSIONS]
+            files += sorted(found)
+        else:
+            files += sorted(f for f in glob.glob(path) if os.path.isfile(f))
+    return files
+
+
+def run_algorithm(filename, algorithm, result, profile=False):
+    """
+    Builds the graph of a project with an algorithm and measures it (run by
+    the worker processes)
+
+    result: dictionary updated with the columns of the results table (except
+            file, algorithm and repetition) as they are known
+    profile: record time and memory of each step of the algorithm
+    """
+    import fileFormats
+    import pert
+    import graph
+    import validation
+
+    result['status'] = 'error'
+    data = fileFormats.load_with_some_format(filename, [fileFormats.PSPProjectFileFormat(),
+                                                        fileFormats.PPCProjectFileFormat()])
+    if not data or not data[0]:
+        result['error'] = 'Can not read or understand file'
+        return
+    activities = data[0]
+
+    successors = {}
+    for act in activities:
+        successors[act[1]] = act[2]
+    prelaciones = graph.reversed_prelation_table(successors)
+    result['activities'] = len(activities)
+    result['prelations'] = sum(len(s) for s in successors.values())
+
+    for name, module, function in ALGORITHMS:
+        if name == algorithm:
+            alg = getattr(importlib.import_module(module), function)
+            break
+    else:
+        raise Exception('Unknown algorithm: ' + algorithm)
+
+    # Construction (only this is measured)
+    memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if profile:
+        steps = profiling.start()
+    itime = os.times()
+    iwall = time.time()
+    pert_graph = alg(prelaciones)
+    fwall = time.time()
+    ftime = os.times()
+    if profile:
+        profiling.stop()
+        result['steps'] = str(steps)
+    result['wall_time'] = fwall - iwall
+    result['cpu_time'] = (ftime[0] - itime[0]) + (ftime[1] - itime[1])
+    result['peak_memory_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memory
+
+    if isinstance(pert_graph, pert.PertMultigraph):
+        pert_graph = pert_graph.to_directed_graph()
+    result['nodes'] = pert_graph.number_of_nodes()
+    result['arcs'] = pert_graph.number_of_arcs()
+    result['real_arcs'] = pert_graph.numArcsReales()
+    result['dummy_arcs'] = pert_graph.numArcsFicticios()
+
+    # Validation prints its diagnostic, keep it as the error message
+    stdout = sys.stdout
+    sys.stdout = StringIO.StringIO()
+    try:
+        valid = validation.check_validation(successors, pert_graph)
+        message = sys.stdout.getvalue().strip()
+    finally:
+        sys.stdout = stdout
+    if valid:
+        result['status'] = 'ok'
+    else:
+        result['status'] = 'invalid'
+        result['error'] = message
+
+
+def _worker(connection, filename, algorithm, profile):
+    """
+    Worker process main function: sends the result of run_algorithm
+    """
+    result = {}
+    try:
+        run_algorithm(filename, algorithm, result, profile)
+    except Exception:
+        result['status'] = 'error'
+        result['error'] = traceback.format_exc().strip().splitlines()[-1]
+    connection.send(result)
+    connection.close()
+
+
+def run_benchmark(files, algorithms, repeat=1, timeout=60.0, workers=1, callback=None,
+                  profile=False):
+    """
+    Runs every algorithm on every file repeat times, each run in a new process
+
+    files, project file names
+    algorithms, names of the algorithms (see ALGORITHMS)
+    timeout, seconds before stopping a run (status 'timeout')
+    workers, number of runs at the same time (use 1 for reliable timings)
+    callback, function called with each row as soon as it is available
+    profile, record time and memory of each step of the algorithms (column steps)
+
+    return: list of rows (dictionaries with FIELDS keys) in the order of the runs
+    """
+    jobs = [(filename, algorithm, r) for filename in files
+                                     for algorithm in algorithms
+                                     for r in range(repeat)]
+    rows = [None] * len(jobs)
+    running = []   # (job index, process, connection, start time)
+    next_job = 0
+    while next_job < len(jobs) or running:
+        # Start runs while there are free workers
+        while next_job < len(jobs) and len(running) < workers:
+            filename, algorithm, r = jobs[next_job]
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=_worker, args=(sender, filename, algorithm, profile))
+            process.start()
+            sender.close()
+            running.append((next_job, process, receiver, time.time()))
+            next_job += 1
+
+        # Collect finished or timed out runs
+        still_running = []
+        for index, process, receiver, start in running:
+            result = None
+            if receiver.poll():
+                try:
+                    result = receiver.recv()
+                except EOFError:
+                    result = {'status': 'error', 'error': 'Worker process died'}
+                process.join()
+            elif not process.is_alive():
+                result = {'status': 'error',
+                          'error': 'Worker process died (exit code %s)' % (process.exitcode, )}
+            elif time.time() - start > timeout:
+                process.terminate()
+                process.join()
+                result = {'status': 'timeout', 'wall_time': time.time() - start}
+
+            if result is None:
+                still_running.append((index, process, receiver, start))
+                continue
+            receiver.close()
+            filename, algorithm, r = jobs[index]
+            row = dict((field, '') for field in FIELDS)
+            row.update(result)
+            row.update({'file': filename, 'algorithm': algorithm, 'repetition': r})
+            rows[index] = row
+            if callback:
+                callback(row)
+        running = still_running
+        if running:
+            time.sleep(0.005)
+
+    return rows
+
+
+def read_table(filename):
+    """
+    Reads a results table written by run_benchmark
+
+    return: list of rows (dictionaries)
+    """
+    with open(filename, 'rb') as f:
+        return list(csv.DictReader(f))
+
+
+def _median(values):
+    """
+    Median of a non empty list of numbers
+    """
+    values = sorted(values)
+    n = len(values)
+    if n % 2:
+        return values[n // 2]
+    return (values[n // 2 - 1] + values[n // 2]) / 2.0
+
+
+def group_runs(rows):
+    """
+    Groups the runs of a table by (file, algorithm)
+
+    return: {(file, algorithm) : {'status': status of all runs ('ok' only if all are ok),
+                                  'wall_time': median, 'cpu_time': median,
+                                  'peak_memory_kb': maximum, 'dummy_arcs': of the last run}, ...}
+    """
+    runs = collections.OrderedDict()
+    for row in rows:
+        runs.setdefault((row['file'], row['algorithm']), []).append(row)
+
+    groups = collections.OrderedDict()
+    for key, group in runs.items():
+        statuses = set(row['status'] for row in group)
+        summary = {'status': 'ok' if statuses == set(['ok']) else '/'.join(sorted(statuses)),
+                   'runs': len(group)}
+        ok = [row for row in group if row['status'] == 'ok']
+        if ok:
+            summary['wall_time'] = _median([float(row['wall_time']) for row in ok])
+            summary['cpu_time'] = _median([float(row['cpu_time']) for row in ok])
+            summary['peak_memory_kb'] = max(int(row['peak_memory_kb']) for row in ok)
+            summary['dummy_arcs'] = int(ok[-1]['dummy_arcs'])
+        groups[key] = summary
+    return groups
+
+
+def summary(rows):
+    """
+    Text with a summary of the runs of each algorithm
+    """
+    algorithms = collections.OrderedDict()
+    for (filename, algorithm), group in group_runs(rows).items():
+        algorithms.setdefault(algorithm, []).append(group)
+
+    lines = ['%-16s %6s %6s %8s %8s %12s %12s %10s' % ('Algorithm', 'Files', 'Ok', 'Invalid',
+             'Timeout', 'Wall (s)', 'CPU (s)', 'Dummies')]
+    for algorithm, groups in algorithms.items():
+        ok = [g for g in groups if g['status'] == 'ok']
+        lines.append('%-16s %6d %6d %8d %8d %12.4f %12.4f %10d' % (algorithm, len(groups), len(ok),
+                     len([g for g in groups if 'invalid' in g['status']]),
+                     len([g for g in groups if 'timeout' in g['status']]),
+                     sum(g['wall_time'] for g in ok), sum(g['cpu_time'] for g in ok),
+                     sum(g['dummy_arcs'] for g in ok)))
+    return '\n'.join(lines)
+
+
+def compare(old_rows, new_rows, threshold=0.1):
+    """
+    Text comparing two benchmark tables: for each algorithm, geometric mean of
+    the wall time ratios (new / old) of the files run correctly in both, files
+    with a ratio over 1 + threshold and status or number of dummies changes
+
+    return: (text, number of regressions found)
+    """
+    old = group_runs(old_rows)
+    new = group_runs(new_rows)
+
+    ratios = collections.OrderedDict()
+    lines = []
+    regressions = 0
+    for key, n in new.items():
+        if key not in old:
+            continue
+        o = old[key]
+        filename, algorithm = key
+        ratios.setdefault(algorithm, [])
+        if o['status'] != n['status']:
+            lines.append('%s %s: status %s -> %s' % (algorithm, filename, o['status'], n['status']))
+            if o['status'] == 'ok':
+                regressions += 1
+            continue
+        if n['status'] != 'ok':
+            continue
+        if o['dummy_arcs'] != n['dummy_arcs']:
+            lines.append('%s %s: dummy arcs %d -> %d' % (algorithm, filename, o['dummy_arcs'], n['dummy_arcs']))
+        if o['wall_time'] > 0 and n['wall_time'] > 0:
+            ratio = n['wall_time'] / o['wall_time']
+            ratios[algorithm].append(ratio)
+            if ratio > 1 + threshold:
+                regressions += 1
+                lines.append('%s %s: wall time %.4f -> %.4f (x%.2f)' % (algorithm, filename,
+                             o['wall_time'], n['wall_time'], ratio))
+
+    header = ['%-16s %6s %16s' % ('Algorithm', 'Files', 'Time new/old')]
+    for algorithm, values in ratios.items():
+        if values:
+            mean = math.exp(sum(math.log(r) for r in values) / len(values))
+            header.append('%-16s %6d %16.3f' % (algorithm, len(values), mean))
+        else:
+            header.append('%-16s %6d %16s' % (algorithm, 0, '-'))
+    return '\n'.join(header + [''] + lines), regressions
+
+
+def main(argv=None):
+    """
+    Runs the benchmark or compares results tables (see module documentation)
+    """
+    parser = argparse.ArgumentParser(description='Benchmark of AOA graph construction algorithms')
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', help='Run the algorithms on project files')
+    run_parser.add_argument('projects', nargs='+',
+                            help='Project files, folders with project files or glob patterns')
+    run_parser.add_argument('--algorithms', '-a', nargs='+', default=[a[0] for a in ALGORITHMS],
+                            choices=[a[0] for a in ALGORITHMS],
+                            help='Algorithms to run (default: all)')
+    run_parser.add_argument('--table-file', '-t', default='benchmark.csv',
+                            help='Name of file to append results in CSV format (default: benchmark.csv)')
+    run_parser.add_argument('-r', '--repeat', default=1, type=int,
+                            help='Number of repetitions of each run (default: 1)')
+    run_parser.add_argument('--timeout', default=60.0, type=float,
+                            help='Seconds before stopping a run (default: 60)')
+    run_parser.add_argument('--workers', '-w', default=1, type=int,
+                            help='Runs at the same time (default: 1, more may distort timings)')
+    run_parser.add_argument('--profile', action='store_true',
+                            help='Record time and memory of each step of the algorithms')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two results tables')
+    compare_parser.add_argument('old_table', help='Results of the reference run')
+    compare_parser.add_argument('new_table', help='Results of the run to check')
+    compare_parser.add_argument('--threshold', default=0.1, type=float,
+                                help='Relative wall time increase reported as regression (default: 0.1)')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        text, regressions = compare(read_table(args.old_table), read_table(args.new_table),
+                                    args.threshold)
+        print text
+        return 1 if regressions else 0
+
+    if args.repeat < 1 or args.workers < 1 or args.timeout <= 0:
+        print 'Repetitions, workers and timeout must be > 0'
+        return 1
+
+    files = project_files(args.projects)
+    if not files:
+        print 'ERROR: No project files found'
+        return 1
+
+    write_header = not os.path.isfile(args.table_file)
+    try:
+        f_csv = open(args.table_file, 'ab')
+    except IOError:
+        print 'Can not open table file (%s) to append results in CSV format' % (args.table_file, )
+        return 1
+    writer = csv.DictWriter(f_csv, FIELDS)
+    if write_header:
+        writer.writeheader()
+
+    def write_row(row):
+        writer.writerow(row)
+        f_csv.flush()
+        print '%s %s %s %s' % (row['file'], row['algorithm'], row['status'], row['wall_time'])
+
+    try:
+        rows = run_benchmark(files, args.algorithms, args.repeat, args.timeout,
+                             args.workers, write_row, args.profile)
+    finally:
+        f_csv.close()
+
+    print
+    print summary(rows)
+    return 0
+
+# If the program is run directly
+if __name__ == '__main__':
+    # Imports needed just for main()
+    import argparse
+    # Run
+    sys.exit(main())
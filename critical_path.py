@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ Array based critical path method (module of PPC-PROJECT)
+
+ A renumbered PERT graph (as returned by pert.pertFinal) is compiled once into
+ arc arrays in topological order. Early and last node times are then computed
+ for all the iterations of a simulation at once with numpy, so the cost of
+ each iteration is O(arcs) instead of the O(nodes^2) of the Zaderenko matrix.
+
+ Copyright 2007-15 Universidad de Córdoba
+ This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published
+   by the Free Software Foundation, either version 3 of the License,
+   or (at your option) any later version.
+ This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+ You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import collections
+
+import numpy
+
+import graph
+
+
+class CompiledPert(object):
+    """
+    PERT graph compiled into arc arrays
+
+        n_nodes, number of nodes (node numbers in graph go from 1 to n_nodes)
+        origin, destination: 0 based node index (node number - 1) of each arc
+        activity, column of the arc activity in the durations matrix
+                  (n_activities for dummy arcs, which always last 0)
+        labels, (ActivityLabel, DummyActivity) of each arc
+        names, activity labels in the order of the durations matrix columns
+        successors, successors table of the activities
+
+    Arcs are sorted by (origin, destination). As the graph is renumbered, an
+    origin node has always a lower number than its destination.
+    """
+    def __init__(self, pert_graph, activities):
+        """
+        pert_graph: renumbered pert.Pert graph (nodes numbered from 1 to N)
+        activities: project activities, their order gives the columns of the
+                    durations matrices
+        """
+        self.n_nodes = len(pert_graph.successors)
+        self.n_activities = len(activities)
+        self.names = [act[1] for act in activities]
+        self.successors = dict(((act[1], act[2]) for act in activities))
+
+        column = {}
+        for n in range(len(activities)):
+            column[activities[n][1]] = n
+
+        arcs = sorted(pert_graph.arcs)
+        self.labels = [pert_graph.arcs[arc] for arc in arcs]
+        self.origin = numpy.array([i - 1 for i, j in arcs], dtype=int)
+        self.destination = numpy.array([j - 1 for i, j in arcs], dtype=int)
+        self.activity = numpy.array([self.n_activities if dummy else column[label]
+                                     for label, dummy in self.labels], dtype=int)
+
+        # Arcs reaching and leaving each node: [ (node, arc indexes), ... ]
+        incoming = {}
+        outgoing = {}
+        for a in range(len(arcs)):
+            incoming.setdefault(self.destination[a], []).append(a)
+            outgoing.setdefault(self.origin[a], []).append(a)
+        self._incoming = [(node, numpy.array(incoming[node])) for node in sorted(incoming)]
+        self._outgoing = [(node, numpy.array(outgoing[node])) for node in sorted(outgoing, reverse=True)]
+
+    def arc_durations(self, durations):
+        """
+        Duration of every arc in each iteration
+
+        durations: (iterations x activities) matrix (or a single row)
+
+        return: (iterations x arcs) array (dummy arcs last 0)
+        """
+        durations = numpy.atleast_2d(numpy.asarray(durations, dtype=float))
+        padded = numpy.zeros((durations.shape[0], self.n_activities + 1))
+        padded[:, :self.n_activities] = durations
+        return padded[:, self.activity]
+
+    def early(self, durations):
+        """
+        Forward pass, early times of every node in each iteration
+
+        durations: (iterations x activities) matrix (or a single row)
+
+        return: (iterations x nodes) array, the last column is the project duration
+        """
+        arc_dur = self.arc_durations(durations)
+        early = numpy.zeros((arc_dur.shape[0], self.n_nodes))
+        for node, arcs in self._incoming:
+            reach = early[:, self.origin[arcs]] + arc_dur[:, arcs]
+            early[:, node] = numpy.maximum(reach.max(axis=1), 0.0)
+        return early
+
+    def last(self, durations, early=None):
+        """
+        Backward pass, last times of every node in each iteration
+
+        durations: (iterations x activities) matrix (or a single row)
+        early: early times returned by early() (computed if not given)
+
+        return: (iterations x nodes) array
+        """
+        arc_dur = self.arc_durations(durations)
+        if early is None:
+            early = self.early(durations)
+        project = early[:, -1]
+        last = numpy.empty_like(early)
+        last[:] = project[:, numpy.newaxis]
+        for node, arcs in self._outgoing:
+            reach = last[:, self.destination[arcs]] - arc_dur[:, arcs]
+            last[:, node] = numpy.minimum(reach.min(axis=1), project)
+        return last
+
+    def project_durations(self, durations):
+        """
+        Duration of the project in each iteration
+
+        return: array with as many elements as iterations
+        """
+        return self.early(durations)[:, -1]
+
+    def slacks(self, durations, early, last):
+        """
+        Total slack of every arc in each iteration
+
+        return: (iterations x arcs) array
+        """
+        return last[:, self.destination] - early[:, self.origin] - self.arc_durations(durations)
+
+    def critical_activities(self, durations, early, last, tolerance=0.001):
+        """
+        Critical activities (total slack 0) in each iteration
+
+        return: (iterations x activities) boolean array
+        """
+        slack = self.slacks(durations, early, last)
+        real = self.activity < self.n_activities
+        critical = numpy.zeros((slack.shape[0], self.n_activities), dtype=bool)
+        critical[:, self.activity[real]] = numpy.abs(slack[:, real]) < tolerance
+        return critical
+
+    def criticality_indices(self, critical):
+        """
+        Criticality index of each activity (fraction of iterations where it is critical)
+
+        critical: boolean array returned by critical_activities()
+
+        return: array with an index for each activity
+        """
+        return critical.mean(axis=0)
+
+    def path_criticality(self, critical):
+        """
+        Number of iterations in which each path of the project is critical 
+        (all its activities are critical)
+
+        Paths are only searched once for each different set of critical 
+        activities found, among critical activities.
+
+        critical: boolean array returned by critical_activities()
+
+        return: {(activity label, ...) : number of iterations, ...}
+        """
+        criticidad = collections.defaultdict(int)
+        if critical.shape[0] == 0:
+            return criticidad
+
+        begining = graph.begining_activities(self.successors)
+        patterns, counts = numpy.unique(critical, axis=0, return_counts=True)
+        for pattern, count in zip(patterns, counts):
+            # ROY graph of critical activities (paths must start and end as in the whole graph)
+            criticas = set(self.names[n] for n in numpy.nonzero(pattern)[0])
+            roy = {'Begin': [act for act in self.names if act in criticas and act in begining],
+                   'End': []}
+            for act in criticas:
+                if self.successors[act]:
+                    roy[act] = [a for a in self.successors[act] if a in criticas]
+                else:
+                    roy[act] = ['End']
+
+            for camino in graph.find_all_paths(roy, 'Begin', 'End'):
+                criticidad[tuple(camino[1:-1])] += int(count)
+        return criticidad
@@ -308,7 +308,8 @@ def guardarCsv(texto, principal):
     """
      Salva texto en formato CSV
 
-     Parámetros: texto (texto a guardar)
+     Parámetros: texto (texto a guardar o iterable con las líneas de texto,
+                        que se escriben según se generan)
 
      Valor de retorno: -
     """
@@ -325,7 +326,10 @@ def guardarCsv(texto, principal):
                 fescritura = open(nombre, 'w')
             else:
                 fescritura = open(nombre + '.csv', 'w')
-            fescritura.write(texto)
+            if isinstance(texto, basestring):
+                fescritura.write(texto)
+            else:
+                fescritura.writelines(texto)
         except IOError:
             principal.dialogoError(_('Error saving the file'))
         fescritura.close()
@@ -58,6 +58,7 @@ Graph related classes and functions (module of PPC-PROJECT), includes:
 """
 import subprocess
 import copy
+import array
 
 class DirectedMultigraph(object):
     """
@@ -183,36 +184,27 @@ class DirectedGraph(object):
             self.add_node(origin)
         if destination not in self.successors:
             self.add_node(destination)
-        if destination not in self.successors[origin]:
+        # arcs, successors and predecessors always hold the same arcs (O(1) test)
+        if (origin, destination) not in self.arcs:
             self.successors[origin].append(destination)
-        if origin not in self.predecessors[destination]:
             self.predecessors[destination].append(origin)
         self.arcs[(origin, destination)] = label 
         
     def remove_node(self, node):
         """
-        Remove a node from the graph and all arcs referencing it
+        Remove a node from the graph and all arcs referencing it O(degree)
         """
-        if node in self.successors:
-            del self.successors[node]
-        if node in self.predecessors:
-            del self.predecessors[node]
-        
-        for i in self.successors:
-            if node in self.successors[i]:
-                self.successors[i].remove(node)
-        for i in self.predecessors:
-            if node in self.predecessors[i]:
-                self.predecessors[i].remove(node)
+        outputs = self.successors.pop(node, [])
+        inputs = self.predecessors.pop(node, [])
 
-        lista_borrar = []
-        for (i, j) in self.arcs:
-            if i == node:
-                lista_borrar.append((i, j))
-            if j == node:
-                lista_borrar.append((i, j))
-        for i, j in lista_borrar:
-            del self.arcs[(i, j)]
+        for i in outputs:
+            if i != node:
+                self.predecessors[i].remove(node)
+            del self.arcs[(node, i)]
+        for i in inputs:
+            if i != node:
+                self.successors[i].remove(node)
+                del self.arcs[(i, node)]
 
     def remove_arc(self, arc):
         """
@@ -273,21 +265,251 @@ class DirectedGraph(object):
         return new_graph
 
 
+class IndexedGraph(object):
+    """
+    Directed graph with nodes and arc labels interned to integers
+
+    Compact alternative backend to DirectedGraph for large graphs. Nodes are
+    numbered 0..n-1 in order of insertion and each node keeps its adjacent
+    node numbers both in a list (keeping the order of insertion, as
+    DirectedGraph) and in a set. Testing, adding and removing an arc is O(1)
+    (O(degree) to remove it from the lists) and removing a node is O(degree).
+
+        nodes, node of each node number (None once removed)
+        number, node number of each node
+        out_list, in_list: lists with successor/predecessor node numbers of each node number
+        out_set, in_set: same as sets
+        arc_label, {(origin number, destination number) : label number}
+        labels, label of each label number (equal labels share the same number)
+
+    Use from_directed_graph() and to_directed_graph() to convert to and from
+    DirectedGraph (or subclasses as pert.Pert).
+    """
+    def __init__(self):
+        """
+        Creates an empty graph
+        """
+        self.nodes = []
+        self.number = {}
+        self.out_list = []
+        self.in_list = []
+        self.out_set = []
+        self.in_set = []
+        self.arc_label = {}
+        self.labels = []
+        self.label_number = {}
+
+    @classmethod
+    def from_directed_graph(cls, directed_graph):
+        """
+        Creates an indexed graph with the nodes and arcs of a DirectedGraph
+        (keeping the order of successors and predecessors)
+        """
+        indexed = cls()
+        for node in directed_graph.successors:
+            indexed.add_node(node)
+        for node, outputs in directed_graph.successors.items():
+            for suc in outputs:
+                indexed.add_arc( (node, suc), directed_graph.arcs.get((node, suc)) )
+        for node, inputs in directed_graph.predecessors.items():
+            n = indexed.number[node]
+            indexed.in_list[n] = [indexed.number[pre] for pre in inputs]
+        return indexed
+
+    def to_directed_graph(self, graph_class=DirectedGraph):
+        """
+        Returns a new graph_class (DirectedGraph or subclass) object with
+        the nodes and arcs of this graph
+        """
+        directed_graph = graph_class()
+        for node, n in sorted(self.number.items(), key=lambda item: item[1]):
+            directed_graph.successors[node] = [self.nodes[i] for i in self.out_list[n]]
+            directed_graph.predecessors[node] = [self.nodes[i] for i in self.in_list[n]]
+        for (i, j), label in self.arc_label.iteritems():
+            directed_graph.arcs[(self.nodes[i], self.nodes[j])] = self.labels[label]
+        return directed_graph
+
+    def intern_label(self, label):
+        """
+        Returns the number of a label (creating it if new)
+        """
+        if label not in self.label_number:
+            self.label_number[label] = len(self.labels)
+            self.labels.append(label)
+        return self.label_number[label]
+
+    def add_node(self, node):
+        """
+        Add an unconnected node to graph (if not present)
+
+        return: the node number
+        """
+        if node in self.number:
+            return self.number[node]
+        n = len(self.nodes)
+        self.number[node] = n
+        self.nodes.append(node)
+        self.out_list.append([])
+        self.in_list.append([])
+        self.out_set.append(set())
+        self.in_set.append(set())
+        return n
+
+    def add_arc(self, arc, label=None):
+        """
+        Insert an arc in the graph. If origin, destination nodes are not present in graph they get created.
+
+        arc = (origin node, destination)
+        label = label to be linked with arc (maybe None if unlabeled)
+        """
+        origin, destination = arc
+        i = self.add_node(origin)
+        j = self.add_node(destination)
+        if j not in self.out_set[i]:
+            self.out_set[i].add(j)
+            self.out_list[i].append(j)
+            self.in_set[j].add(i)
+            self.in_list[j].append(i)
+        self.arc_label[(i, j)] = self.intern_label(label)
+
+    def has_arc(self, arc):
+        """
+        Is the arc (origin, destination) in the graph? O(1)
+        """
+        origin, destination = arc
+        if origin not in self.number or destination not in self.number:
+            return False
+        return self.number[destination] in self.out_set[self.number[origin]]
+
+    def label(self, arc):
+        """
+        Returns the label of the arc (origin, destination)
+        """
+        origin, destination = arc
+        return self.labels[self.arc_label[(self.number[origin], self.number[destination])]]
+
+    def remove_arc(self, arc):
+        """
+        Remove an Arc from the graph
+         arc = (origin, destination)
+
+        return: the label of the arc
+        """
+        origin, destination = arc
+        i = self.number[origin]
+        j = self.number[destination]
+        self.out_set[i].remove(j)
+        self.out_list[i].remove(j)
+        self.in_set[j].remove(i)
+        self.in_list[j].remove(i)
+        return self.labels[self.arc_label.pop((i, j))]
+
+    def remove_node(self, node):
+        """
+        Remove a node from the graph and all arcs referencing it O(degree)
+
+        The node number is not reused.
+        """
+        n = self.number.pop(node)
+        for j in self.out_list[n]:
+            if j != n:
+                self.in_set[j].discard(n)
+                self.in_list[j].remove(n)
+            del self.arc_label[(n, j)]
+        for i in self.in_list[n]:
+            if i != n:
+                self.out_set[i].discard(n)
+                self.out_list[i].remove(n)
+                del self.arc_label[(i, n)]
+        self.nodes[n] = None
+        self.out_list[n] = []
+        self.in_list[n] = []
+        self.out_set[n] = set()
+        self.in_set[n] = set()
+
+    def suc(self, node):
+        """
+        Returns successors of node
+        """
+        return [self.nodes[j] for j in self.out_list[self.number[node]]]
+
+    def pre(self, node):
+        """
+        Returns predecesors of node
+        """
+        return [self.nodes[i] for i in self.in_list[self.number[node]]]
+
+    def number_of_nodes(self):
+        """
+        Return the number of nodes in graph
+        """
+        return len(self.number)
+
+    def number_of_arcs(self):
+        """
+        Return the number of arcs in graph
+        """
+        return len(self.arc_label)
+
+    def to_csr(self):
+        """
+        Successors in compressed sparse row format (numbers of removed nodes
+        have no successors)
+
+        return: (indptr, indices) arrays of integers, successors of node
+                number n are indices[indptr[n]:indptr[n+1]]
+        """
+        indptr = array.array('l', [0])
+        indices = array.array('l')
+        for outputs in self.out_list:
+            indices.extend(outputs)
+            indptr.append(len(indices))
+        return indptr, indices
+
+
 #
 # Precedent and successor table operations
 #
 
 def reversed_prelation_table(graph):
     """
-    Returns a new prelation table with all arcs reversed.
+    Returns a new prelation table with all arcs reversed. O(V+E)
+
+    Nodes in the new table are listed in the order of the graph keys (nodes
+    only present in lists of the given table are not included).
     """
     reverted = {}
     for node in graph:
-        inputs = []
-        for key, out in graph.items():
-            if node in out:
+        reverted[node] = []
+    for key, out in graph.items():
+        for node in out:
+            inputs = reverted.get(node)
+            # Repeated arcs are added once (they come together in out)
+            if inputs is not None and (not inputs or inputs[-1] != key):
                 inputs.append(key)
-        reverted[node] = inputs
+    return reverted
+
+def update_reversed_prelation_table(reverted, added=(), removed=()):
+    """
+    Updates a table returned by reversed_prelation_table after arcs are added
+    to or removed from the original table (instead of reversing it again)
+
+    reverted: reversed prelation table (modified in place)
+    added, removed: lists of arcs (origin, destination) of the original table,
+                    missing nodes are created
+
+    Added arcs are placed last in the list of their destination node.
+    """
+    for origin, destination in removed:
+        inputs = reverted.get(destination)
+        if inputs and origin in inputs:
+            inputs.remove(origin)
+    for origin, destination in added:
+        if origin not in reverted:
+            reverted[origin] = []
+        inputs = reverted.setdefault(destination, [])
+        if origin not in inputs:
+            inputs.append(origin)
     return reverted
 
 def successors2precedents(successors):
@@ -466,19 +688,70 @@ def find_all_paths(graph, start, end, path=None):
     if path == None:
         path = []
 
-    path = path + [start]
-    if start == end:
-        return [path]
-    paths = []
-    for node in graph[start]:
-        # Must be tested outside (precondition)
-        #if node in path: 
-        #    raise Exception("CYCLIC GRAPH!!")
-        new_paths = find_all_paths(graph, node, end, path)
-        for new_path in new_paths:
-            paths.append(new_path)
+    return [path + new_path for new_path in iter_paths(graph, start, end)]
 
-    return paths
+
+def iter_paths(graph, start, end, after=None):
+    """
+    Generates all paths between start and end in an acyclic graph, one at a
+    time and in the same order as find_all_paths (depth first following the
+    order of successors). It is not recursive, so long chains of nodes are
+    not limited by the recursion depth.
+
+    Preconditions: graph must not have cycles
+                   start and end must be nodes in graph
+    after: cursor, a path previously generated. If given, generation resumes
+           with the path following it
+    returns: generator of paths given as list of nodes including start and end nodes
+    """
+    if after is None:
+        if start == end:
+            yield [start]
+            return
+        path = [start]
+        index = [0]
+    else:
+        # Rebuild the search state just after the cursor path
+        path = list(after[:-1])
+        index = [graph[path[i]].index(after[i + 1]) + 1 for i in range(len(path))]
+
+    # index[i] is the position of the next successor of path[i] to explore
+    while path:
+        successors = graph[path[-1]]
+        i = index[-1]
+        if i < len(successors):
+            index[-1] = i + 1
+            node = successors[i]
+            if node == end:
+                yield path + [end]
+            else:
+                path.append(node)
+                index.append(0)
+        else:
+            path.pop()
+            index.pop()
+
+
+def paths_page(graph, start, end, count, predicate=None, after=None):
+    """
+    Gets the next page of paths between start and end (see iter_paths)
+
+    count: maximum number of paths in the page (at least 1)
+    predicate: function receiving a path and returning False to skip it (None: no filter)
+    after: cursor returned by the previous page (None for the first one)
+
+    returns: (paths, cursor), cursor is None if there are no more paths
+    """
+    if count < 1:
+        raise Exception('A page must have at least one path')
+    paths = []
+    for path in iter_paths(graph, start, end, after):
+        if predicate is None or predicate(path):
+            if len(paths) == count:
+                # There are more paths, the next page begins after the last one
+                return paths, paths[-1]
+            paths.append(path)
+    return paths, None
 
 
 def roy_paths2csv(ordered_activity_list, paths):
@@ -487,28 +760,33 @@ def roy_paths2csv(ordered_activity_list, paths):
     activities in columns and paths in rows, with each cell crossed if
     activity belongs to path
     """
-    csv_text = ''
+    return ''.join(roy_paths_csv_lines(ordered_activity_list, paths))
+
+
+def roy_paths_csv_lines(ordered_activity_list, paths):
+    """
+    Generates the csv lines of roy_paths2csv one by one, so paths may be
+    given by a generator (as iter_paths) and written as they are found
+    """
+    activities = [act for act in ordered_activity_list if act not in ['Begin','End']]
 
     # Header
-    csv_text += 'Paths,'
-    for act in ordered_activity_list:
-        if act not in ['Begin','End']:
-            csv_text += str(act) + ','
-    csv_text += '\n'
+    csv_text = 'Paths,'
+    for act in activities:
+        csv_text += str(act) + ','
+    yield csv_text + '\n'
 
     # Body
     for path in paths:
         trimmed_path = path[1:-1]
-        csv_text += '"' + str(trimmed_path) + '",'
-        for act in ordered_activity_list:
-            if act not in ['Begin','End']:
-                if act in trimmed_path:
-                    csv_text += 'x,'
-                else:
-                    csv_text += ' ,'
-        csv_text += '\n'
-
-    return csv_text
+        in_path = set(trimmed_path)
+        csv_text = '"' + str(trimmed_path) + '",'
+        for act in activities:
+            if act in in_path:
+                csv_text += 'x,'
+            else:
+                csv_text += ' ,'
+        yield csv_text + '\n'
 
 
 #
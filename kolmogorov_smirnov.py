@@ -20,14 +20,12 @@
    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 import math
-import operator
 import collections
 
 import scipy.stats
 import numpy
 
-import graph
-import pert
+import path_analysis
 
 
 def evaluate_models(activities, sim_durations, simulaciones, porcentaje=90, pert_graph=None):
@@ -43,65 +41,27 @@ def evaluate_models(activities, sim_durations, simulaciones, porcentaje=90, pert
 
     return: results (dictionary with all attributes and test results)
     """
-    # Get all paths removing 'begin' y 'end' from each path
-    successors = dict(((act[1], act[2]) for act in activities))
-    aon = graph.roy(successors)
-    caminos = [c[1:-1] for c in graph.find_all_paths(aon, 'Begin', 'End')]
-
-    # List with all paths, their duration and variance (ordered by increasing duration and variance)
-    path_data = []
-    for camino in caminos:   
-        media, varianza = pert.mediaYvarianza(camino, activities) 
-        path_data.append([camino, float(media), float(varianza)])
-    path_data.sort(key=operator.itemgetter(1, 2))
-
-    # Critical path average and std deviation (according to PERT Normal estimate)
-    crit_path_avg = float(path_data[-1][1])
-    crit_path_stdev = math.sqrt(path_data[-1][2]) 
-
-    # Number of predominant paths is calculated according to Dodin (m_dodin) and to ours (m_salas),
-    m_dodin = 0
-    m_salas = 0
-    # Std. dev for selected paths
-    sigma_max = None
-    sigma_min = None
-    sigma_ant = None    
-
-    for i in range(len(path_data)):
-        # Considered critical by Dodin
-        if ((crit_path_avg - path_data[i][1]) < max(0.05*crit_path_avg, 0.02* crit_path_stdev)):
-            m_dodin += 1
-            path_stddev = math.sqrt(path_data[i][2])
-            if sigma_max == None or sigma_max < path_stddev:
-                sigma_max = path_stddev
-            if sigma_min == None or sigma_min > path_stddev:
-                sigma_min = path_stddev
-
-        # Considered critical by Salas
-        if ((float(path_data[i][1]) + 0.5*math.sqrt(path_data[i][2])) >= (crit_path_avg - 0.25* crit_path_stdev)):
-            m_salas += 1
-            path_stdev = math.sqrt(path_data[i][2])
-            if sigma_ant == None or sigma_ant > path_stdev:
-                sigma_ant = path_stdev
+    # Critical path and predominant paths (without generating all paths)
+    paths = path_analysis.predominant_paths(activities)
 
     # Store variables to be used to create models
     attributes = collections.OrderedDict()
-    attributes['crit_path_avg'] = crit_path_avg
-    attributes['crit_path_stdev'] = crit_path_stdev
+    attributes['crit_path_avg'] = paths['crit_path_avg']
+    attributes['crit_path_stdev'] = paths['crit_path_stdev']
 
-    attributes['n_paths'] = len(path_data)
+    attributes['n_paths'] = paths['n_paths']
     if pert_graph:
         attributes['n_nodes'] = len(pert_graph.successors)
     else:
         attributes['n_nodes'] = None
     attributes['n_activ'] = len(activities)
 
-    attributes['m_dodin'] = m_dodin
-    attributes['m_salas'] = m_salas
+    attributes['m_dodin'] = paths['m_dodin']
+    attributes['m_salas'] = paths['m_salas']
 
-    attributes['sigma_max'] = sigma_max
-    attributes['sigma_min'] = sigma_min
-    attributes['sigma_ant'] = sigma_min
+    attributes['sigma_max'] = paths['sigma_max']
+    attributes['sigma_min'] = paths['sigma_min']
+    attributes['sigma_ant'] = paths['sigma_min']
 
     attributes['dist'] = activities[1][8] # for Gamma (which is a 'mutant', a dual model)
 
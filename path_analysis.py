@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ Path statistics of project graphs without enumerating all paths (module of PPC-PROJECT)
+
+ Dense networks may have millions of paths, so instead of using
+ graph.find_all_paths, paths are analysed with dynamic programming over a
+ topological order of the ROY graph (see graph.roy):
+
+  - count_paths: number of paths (exact, without generating them)
+  - longest_paths: paths in decreasing order of mean (or mean + k * sigma)
+    generated by a best-first search guided by the longest suffix of each node,
+    so only the paths requested are generated
+  - predominant_paths: critical path and number of predominant paths
+    according to Dodin and Salas (as needed by kolmogorov_smirnov.evaluate_models)
+
+ Copyright 2007-15 Universidad de Córdoba
+ This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published
+   by the Free Software Foundation, either version 3 of the License,
+   or (at your option) any later version.
+ This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+ You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import heapq
+import itertools
+import math
+
+import graph
+
+
+def topological_order(successors):
+    """
+    Nodes of an acyclic graph sorted so that every node is before its successors (Kahn)
+
+    successors: successors table (nodes not in keys are ignored)
+
+    raise: Exception if the graph has cycles
+    """
+    predecessors = graph.reversed_prelation_table(successors)
+    pending = dict((node, len(pre)) for node, pre in predecessors.items())
+    ready = [node for node in successors if pending[node] == 0]
+    order = []
+    while ready:
+        node = ready.pop()
+        order.append(node)
+        for suc in successors[node]:
+            if suc in pending:
+                pending[suc] -= 1
+                if pending[suc] == 0:
+                    ready.append(suc)
+
+    if len(order) != len(successors):
+        raise Exception('Cyclic graph')
+    return order
+
+
+def count_paths(successors, start='Begin', end='End'):
+    """
+    Number of paths from start to end in an acyclic graph
+
+    successors: successors table (for example a ROY graph)
+    """
+    paths = dict((node, 0) for node in successors)
+    paths[end] = 1
+    for node in reversed(topological_order(successors)):
+        if node != end:
+            paths[node] = sum(paths[suc] for suc in successors[node])
+    return paths[start]
+
+
+def longest_paths(successors, means, variances=None, k=None, sigma_factor=0.0,
+                  bound=None, start='Begin', end='End'):
+    """
+    Generates paths from start to end in decreasing order of
+    mean + sigma_factor * sqrt(variance)
+
+    Partial paths are expanded best first using an upper bound of their
+    best completion (longest suffix mean and variance of their last node),
+    so the number of partial paths expanded is proportional to the number
+    of paths generated (exactly when sigma_factor is 0).
+
+    successors: successors table of an acyclic graph (for example a ROY graph)
+    means, variances: dictionaries with mean and variance of nodes (missing
+                      nodes, as 'Begin' or 'End', count 0)
+    k: maximum number of paths to generate (None, all)
+    bound: stop when mean + sigma_factor * sqrt(variance) is lower than bound
+
+    returns: generator of (path, mean, variance), with path as a list of
+             nodes excluding start and end nodes
+    """
+    if variances is None:
+        variances = {}
+
+    # Longest suffix mean and variance from each node (excluding the node)
+    suffix_mean = {end: 0.0}
+    suffix_var = {end: 0.0}
+    for node in reversed(topological_order(successors)):
+        if node == end:
+            continue
+        reachable = [suc for suc in successors[node] if suc in suffix_mean]
+        if reachable:
+            suffix_mean[node] = max(means.get(suc, 0.0) + suffix_mean[suc] for suc in reachable)
+            suffix_var[node] = max(variances.get(suc, 0.0) + suffix_var[suc] for suc in reachable)
+    if start not in suffix_mean:
+        return
+
+    def key(node, mean, var):
+        return mean + suffix_mean[node] + sigma_factor * math.sqrt(var + suffix_var[node])
+
+    # Heap of partial paths: (-key, tie, node, mean, variance, linked path (node, previous))
+    tie = itertools.count()
+    mean0 = means.get(start, 0.0)
+    var0 = variances.get(start, 0.0)
+    heap = [(-key(start, mean0, var0), next(tie), start, mean0, var0, (start, None))]
+    generated = 0
+    while heap and (k is None or generated < k):
+        neg_key, _, node, mean, var, linked = heapq.heappop(heap)
+        if bound is not None and -neg_key < bound:
+            break
+
+        if node == end:
+            path = []
+            while linked:
+                path.append(linked[0])
+                linked = linked[1]
+            path.reverse()
+            generated += 1
+            yield path[1:-1], mean, var
+            continue
+
+        for suc in successors[node]:
+            if suc in suffix_mean:
+                m = mean + means.get(suc, 0.0)
+                v = var + variances.get(suc, 0.0)
+                heapq.heappush(heap, (-key(suc, m, v), next(tie), suc, m, v, (suc, linked)))
+
+
+def predominant_paths(activities):
+    """
+    Critical path and number of predominant paths of a project according to
+    Dodin (m_dodin) and to Salas (m_salas), with the standard deviation range
+    of the selected paths
+
+    Path averages and variances are rounded to 2 decimals (as pert.mediaYvarianza)
+    before being compared. Only the paths close to the critical one are generated.
+
+    activities: project activities
+
+    return: dictionary with crit_path_avg, crit_path_stdev, n_paths, m_dodin,
+            m_salas, sigma_max, sigma_min, sigma_ant
+    """
+    successors = dict(((act[1], act[2]) for act in activities))
+    roy = graph.roy(successors)
+    means = {}
+    variances = {}
+    for act in activities:
+        means[act[1]] = float(act[6]) if act[6] != '' else 0.0
+        variances[act[1]] = float(act[7])*float(act[7]) if act[7] != '' else 0.0
+
+    def rounded(value):
+        return float('%5.2f' % value)
+
+    # Margin to generate every path that may satisfy a condition once rounded
+    MARGIN = 0.02
+
+    # Critical path: greatest (average, variance) once rounded
+    crit = None
+    first = None
+    for path, mean, var in longest_paths(roy, means, variances):
+        if first is None:
+            first = mean
+        elif mean < first - MARGIN:
+            break
+        candidate = (rounded(mean), rounded(var))
+        if crit is None or candidate > crit:
+            crit = candidate
+    crit_path_avg, crit_path_var = crit
+    crit_path_stdev = math.sqrt(crit_path_var)
+
+    results = {'crit_path_avg': crit_path_avg,
+               'crit_path_stdev': crit_path_stdev,
+               'n_paths': count_paths(roy),
+               'm_dodin': 0,
+               'm_salas': 0,
+               'sigma_max': None,
+               'sigma_min': None,
+               'sigma_ant': None,
+              }
+
+    # Considered critical by Dodin
+    threshold = max(0.05*crit_path_avg, 0.02* crit_path_stdev)
+    for path, mean, var in longest_paths(roy, means, variances,
+                                         bound=crit_path_avg - threshold - MARGIN):
+        if (crit_path_avg - rounded(mean)) < threshold:
+            results['m_dodin'] += 1
+            path_stddev = math.sqrt(rounded(var))
+            if results['sigma_max'] == None or results['sigma_max'] < path_stddev:
+                results['sigma_max'] = path_stddev
+            if results['sigma_min'] == None or results['sigma_min'] > path_stddev:
+                results['sigma_min'] = path_stddev
+
+    # Considered critical by Salas (rounding the variance may change its
+    # square root up to sqrt(0.005))
+    limit = crit_path_avg - 0.25* crit_path_stdev
+    for path, mean, var in longest_paths(roy, means, variances, sigma_factor=0.5,
+                                         bound=limit - MARGIN - 0.5 * math.sqrt(0.005)):
+        if (rounded(mean) + 0.5*math.sqrt(rounded(var))) >= limit:
+            results['m_salas'] += 1
+            path_stdev = math.sqrt(rounded(var))
+            if results['sigma_ant'] == None or results['sigma_ant'] > path_stdev:
+                results['sigma_ant'] = path_stdev
+
+    return results
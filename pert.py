@@ -19,8 +19,13 @@
    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 import sys
+import os
 import graph
 import copy
+import collections
+import hashlib
+import cPickle
+import tempfile
 
 import algoritmoSharma
 
@@ -82,13 +87,26 @@ class Pert(graph.DirectedGraph):
       arc labels store: (ActivityLabel, DummyActivity)
 
     DummyActivity: True if dummy, False if real
+
+    activity_arcs: {real activity label : arc} index kept up to date by
+    add_arc, remove_arc, remove_node and removeDummy (arcs must not be
+    modified directly)
+
+    Real activities reaching/leaving each node through dummies (see
+    inActivitiesR and outActivitiesR) are cached until the graph changes.
     """
     def __init__(self, pert=None):
         super(Pert, self).__init__()
         self.construct = algoritmoSharma.sharma1998ext
+        self.activity_arcs = {}
+        self._in_closure = {}
+        self._out_closure = {}
         if pert != None:
             self.successors, self.arcs = pert
             self.predecessors = graph.reversed_prelation_table(self.successors)
+            for arc, (act, dummy) in self.arcs.iteritems():
+                if not dummy:
+                    self.activity_arcs[act] = arc
 
     def __repr__(self):
         return 'Pert( (' + str(self.successors) + ',' + str(self.arcs) + ') )'
@@ -146,14 +164,60 @@ class Pert(graph.DirectedGraph):
         self.add_arc( (origin, destination), (activityName, dummy) )
         return (origin, destination)
 
+    def add_arc(self, arc, label=None):
+        """
+        Insert an arc in the graph (see graph.DirectedGraph.add_arc)
+        updating the activity index
+        """
+        if arc in self.arcs:
+            self._unindex_arc(arc)
+        self._graph_changed()
+        super(Pert, self).add_arc(arc, label)
+        if label != None and not label[1]:
+            self.activity_arcs[label[0]] = arc
+
+    def remove_arc(self, arc):
+        """
+        Remove an Arc from the graph updating the activity index
+         arc = (origin, destination)
+        """
+        self._unindex_arc(arc)
+        self._graph_changed()
+        return super(Pert, self).remove_arc(arc)
+
+    def remove_node(self, node):
+        """
+        Remove a node from the graph and all arcs referencing it updating
+        the activity index
+        """
+        for outNode in self.successors.get(node, []):
+            self._unindex_arc( (node, outNode) )
+        for inNode in self.predecessors.get(node, []):
+            self._unindex_arc( (inNode, node) )
+        self._graph_changed()
+        super(Pert, self).remove_node(node)
+
+    def _graph_changed(self):
+        """
+        Forgets cached dummy closures (called whenever arcs change)
+        """
+        self._in_closure.clear()
+        self._out_closure.clear()
+
+    def _unindex_arc(self, arc):
+        """
+        Removes the activity of an arc from the activity index
+        """
+        label = self.arcs.get(arc)
+        if label != None and not label[1] and self.activity_arcs.get(label[0]) == arc:
+            del self.activity_arcs[label[0]]
+
     def activityArc(self, activityName):
         """
-        Given an activity name returns the arc which represents it on graph
+        Given a (real) activity name returns the arc which represents it on
+        graph O(1)
         """
-        for arc, act in self.arcs.iteritems():
-            if act[0] == activityName:
-                return arc
-        return None
+        return self.activity_arcs.get(activityName)
 
 
     def inActivities(self, node):
@@ -173,15 +237,23 @@ class Pert(graph.DirectedGraph):
         Return the name of activities preceding node (directly or throgh
         dummies)
         """
-        inAct = []
-        for inNode in self.pre(node):
-            act, dummy = self.arcs[ (inNode, node) ]
-            if dummy:
-                inAct += self.inActivitiesR(inNode)
-            else:
-                inAct.append(act)
+        return list(self._in_dummy_closure(node))
 
-        return inAct
+    def _in_dummy_closure(self, node):
+        """
+        Cached tuple of activities preceding node (directly or through dummies)
+        """
+        if node not in self._in_closure:
+            inAct = []
+            for inNode in self.pre(node):
+                act, dummy = self.arcs[ (inNode, node) ]
+                if dummy:
+                    inAct += self._in_dummy_closure(inNode)
+                else:
+                    inAct.append(act)
+            self._in_closure[node] = tuple(inAct)
+
+        return self._in_closure[node]
 
     def outActivities(self, node):
         """
@@ -200,15 +272,23 @@ class Pert(graph.DirectedGraph):
         Return the name of activities following node (directly or throgh
         dummies)
         """
-        outAct = []
-        for outNode in self.successors[node]:
-            act, dummy = self.arcs[ (node, outNode) ]
-            if dummy:
-                outAct += self.outActivitiesR(outNode)
-            else:
-                outAct.append(act)
+        return list(self._out_dummy_closure(node))
 
-        return outAct
+    def _out_dummy_closure(self, node):
+        """
+        Cached tuple of activities following node (directly or through dummies)
+        """
+        if node not in self._out_closure:
+            outAct = []
+            for outNode in self.successors[node]:
+                act, dummy = self.arcs[ (node, outNode) ]
+                if dummy:
+                    outAct += self._out_dummy_closure(outNode)
+                else:
+                    outAct.append(act)
+            self._out_closure[node] = tuple(outAct)
+
+        return self._out_closure[node]
 
 
     def pertSuccessors(self):
@@ -247,10 +327,10 @@ class Pert(graph.DirectedGraph):
                 return False # Two activities would begin and end in the same nodes
 
         # Implies new prelations?
-        inO  = set( self.inActivitiesR(nodeO) )
-        inD  = set( self.inActivitiesR(nodeD) )
-        outO = set( self.outActivitiesR(nodeO) )
-        outD = set( self.outActivitiesR(nodeD) )
+        inO  = set( self._in_dummy_closure(nodeO) )
+        inD  = set( self._in_dummy_closure(nodeD) )
+        outO = set( self._out_dummy_closure(nodeO) )
+        outD = set( self._out_dummy_closure(nodeD) )
         return inD.issubset(inO) or outO.issubset(outD)
 
     def removeDummy(self, dummy):
@@ -259,6 +339,7 @@ class Pert(graph.DirectedGraph):
         of dummy moving their dependencies to origin)
         """
         nodeO, nodeD = dummy
+        self._graph_changed()
 
         # Removes the dummy activity link from graph
         self.successors[nodeO].remove(nodeD)
@@ -282,9 +363,13 @@ class Pert(graph.DirectedGraph):
         for node in inD:
             act = self.arcs.pop( (node, nodeD) )
             self.arcs[ (node, nodeO) ] = act
+            if not act[1]:
+                self.activity_arcs[act[0]] = (node, nodeO)
         for node in outD:
             act = self.arcs.pop( (nodeD, node) )
             self.arcs[ (nodeO, node) ] = act
+            if not act[1]:
+                self.activity_arcs[act[0]] = (nodeO, node)
 
 
     def makePrelation(self, preName, folName):
@@ -339,36 +424,38 @@ class Pert(graph.DirectedGraph):
     def demoucron(self):
         """
          Divide un grafo PERT en niveles usando el algoritmo de Demoucron
+         (eliminando sucesivamente los nodos sin sucesores, O(V+E) como Kahn)
          Return: lista de listas de nodos representando los niveles de inicio a fin
         """
-        nodos = self.successors.keys()
-
-        # v inicial, se obtiene un diccionario con la suma de '1' de cada nodo
+        # v inicial, se obtiene un diccionario con el numero de sucesores de cada nodo
         v = {}
-        for n in nodos:
-            v[n] = 0
-            for m in nodos:
-                if (n, m) in self.arcs:
-                    v[n] += 1
+        for n in self.successors:
+            v[n] = len(self.successors[n])
+
+        # Los nodos de cada nivel se devuelven en el orden de recorrido de v
+        posicion = {}
+        for n in v:
+            posicion[n] = len(posicion)
 
-        num = 0
         niveles = []
-        # Mientras haya un nodo no marcado
-        while [e for e in v if v[e] != 'x']:
-            # Se establecen los nodos del nivel
-            niveles.append([])
-            for i in v:
-                if v[i] == 0:
-                    v[i] = 'x'
-                    niveles[num].append(i)
+        nivel = [n for n in v if v[n] == 0]
+        marcados = 0
+        while nivel:
+            niveles.append(nivel)
+            marcados += len(nivel)
 
             # Actualiza v quitando el nivel procesado
-            for m in v:
-                if v[m] != 'x':
-                    for a in niveles[num]:
-                        if (m, a) in self.arcs:
-                            v[m] -= 1
-            num += 1
+            siguiente = []
+            for a in nivel:
+                for m in self.predecessors[a]:
+                    v[m] -= 1
+                    if v[m] == 0:
+                        siguiente.append(m)
+            siguiente.sort(key=posicion.get)
+            nivel = siguiente
+
+        if marcados != len(v):
+            raise Exception('Cyclic graph')
 
         niveles.reverse()
         return niveles
@@ -385,78 +472,121 @@ class Pert(graph.DirectedGraph):
         # Se crea un diccionario con la equivalencia entre los nodos originales y los nuevos
         s = 1
         nuevosNodos = {}
-        for m in range(len(niveles)):
-            if len(niveles[m]) == 1:
-                nuevosNodos[niveles[m][0]] = s
+        for nivel in niveles:
+            for a in nivel:
+                nuevosNodos[a] = s
                 s += 1
-            else:
-                for a in niveles[m]:
-                    nuevosNodos[a] = s
-                    s += 1
 
         # Se crea un nuevo grafo
         nuevoGrafo = Pert()
 
         # New activities'
-        for n in self.arcs:
-            for m in nuevosNodos:
-                if n[0] == m:
-                    for a in nuevosNodos:
-                        if n[1] == a:
-                            nuevoGrafo.add_arc( (nuevosNodos[m], nuevosNodos[a]), self.arcs[n] )
-
-                elif n[1] == m:
-                    for a in nuevosNodos:
-                        if n[0] == a:
-                            nuevoGrafo.add_arc( (nuevosNodos[a], nuevosNodos[m]), self.arcs[n] )
+        for (o, d), act in self.arcs.iteritems():
+            nuevoGrafo.add_arc( (nuevosNodos[o], nuevosNodos[d]), act )
 
         return nuevoGrafo
 
 
-def get_activities_start_time(activities, durations, prelations, minimum=True,
-                              previous_times=None, root_activity=None):
+class ActivitiesScheduler(object):
     """
-    Get activities start time
+    Start times of activities given their prelations
+
+    Reverse prelations and a topological order of the activities are
+    computed once, so start times are computed in O(V+E) and, when only an
+    activity changes, just its descendants are computed again.
+
+        activities, list of activities
+        prelations, {activity : [following activities], ...}
+        inv_prelations, {activity : [preceding activities], ...}
+        order, activities in topological order (activities in cycles are missing)
     """
-    if previous_times == None:
-        previous_times = {}
-
-    open_list = []
-    inv_prelations = {}
-    closed_list = []
-    start_time = {}
-    for activity in activities:
-        inv_prelations[activity] = []
-    for activity in activities:
-        for children in prelations[activity]:
-            inv_prelations[children].append(activity)
-    if root_activity == None:
+    def __init__(self, activities, prelations):
+        self.activities = list(activities)
+        self.prelations = {}
+        self.inv_prelations = {}
+        for activity in activities:
+            self.prelations[activity] = list(prelations[activity])
+            self.inv_prelations[activity] = []
         for activity in activities:
-            if inv_prelations[activity] == []:
-                open_list.append(activity)
-    else:
-        descendants = [root_activity]
-        open_descendants = copy.deepcopy(prelations[root_activity])
-        while open_descendants != []:
-            activity = open_descendants.pop()
-            descendants.append(activity)
             for children in prelations[activity]:
-                if children not in descendants and children not in open_descendants:
-                    open_descendants.append(children)
+                self.inv_prelations[children].append(activity)
+
+        # Topological order (Kahn)
+        pending = dict((activity, len(self.inv_prelations[activity])) for activity in activities)
+        ready = [activity for activity in activities if pending[activity] == 0]
+        self.order = []
+        while ready:
+            activity = ready.pop()
+            self.order.append(activity)
+            for children in self.prelations[activity]:
+                pending[children] -= 1
+                if pending[children] == 0:
+                    ready.append(children)
+
+    def has_prelations(self, activities, prelations):
+        """
+        Were the same activities and prelations used to create the scheduler?
+        """
+        if self.activities != list(activities):
+            return False
         for activity in activities:
+            if self.prelations[activity] != list(prelations[activity]):
+                return False
+        return True
+
+    def descendants(self, root_activity):
+        """
+        Set with an activity and all the activities following it (directly or not)
+        """
+        descendants = set([root_activity])
+        open_descendants = [root_activity]
+        while open_descendants:
+            activity = open_descendants.pop()
+            for children in self.prelations[activity]:
+                if children not in descendants:
+                    descendants.add(children)
+                    open_descendants.append(children)
+        return descendants
+
+    def start_times(self, durations, minimum=True, previous_times=None, root_activity=None):
+        """
+        Get activities start time (see get_activities_start_time)
+        """
+        if previous_times == None:
+            previous_times = {}
+
+        start_time = {}
+        if root_activity == None:
+            for activity in self.order:
+                self._set_start_time(activity, start_time, durations, minimum, previous_times)
+            return start_time
+
+        # Only descendants of root_activity change, processed in topological order
+        descendants = self.descendants(root_activity)
+        for activity in self.activities:
             if activity not in descendants:
-                closed_list.append(activity)
-                try:
-                    start_time[activity] = previous_times[activity]
-                except:
-                    start_time[activity] = 0
-        open_list.append(root_activity)
-    while open_list != []:
-        chosen = open_list.pop()
-        closed_list.append(chosen)
+                start_time[activity] = previous_times.get(activity, 0)
+
+        pending = {}
+        for activity in descendants:
+            pending[activity] = len([parent for parent in self.inv_prelations[activity] 
+                                     if parent in descendants])
+        open_list = [root_activity]
+        while open_list:
+            chosen = open_list.pop()
+            self._set_start_time(chosen, start_time, durations, minimum, previous_times)
+            for activity in self.prelations[chosen]:
+                pending[activity] -= 1
+                if pending[activity] == 0:
+                    open_list.append(activity)
+        return start_time
+
+    def _set_start_time(self, chosen, start_time, durations, minimum, previous_times):
+        """
+        Start time of an activity once the start times of its predecessors are known
+        """
         time = [0]
-        for activity in inv_prelations[chosen]:
-            # print 'XX start_time[a], duractions[a]', start_time[activity], durations[activity]
+        for activity in self.inv_prelations[chosen]:
             # El float() de la siguiente linea es porque en algun momento se guarda como cadena
             # Investigar y corregir.
             if durations[activity] == '':
@@ -465,20 +595,34 @@ def get_activities_start_time(activities, durations, prelations, minimum=True,
                 dur_act = float(durations[activity])
             time.append(start_time[activity] + dur_act )
 
-        if previous_times != {} and not minimum:
-            try:
-                time.append(previous_times[chosen])
-            except:
-                pass
+        if previous_times != {} and not minimum and chosen in previous_times:
+            time.append(previous_times[chosen])
         start_time[chosen] = max(time)
-        for activity in prelations[chosen]:
-            pending = False
-            for parent in inv_prelations[activity]:
-                if parent not in closed_list:
-                    pending = True
-            if not pending:
-                open_list.append(activity)
-    return(start_time)
+
+
+# Scheduler of the last prelations used by get_activities_start_time
+_scheduler = None
+
+def get_activities_start_time(activities, durations, prelations, minimum=True,
+                              previous_times=None, root_activity=None):
+    """
+    Get activities start time
+
+    activities, list of activities
+    durations, {activity : duration, ...}
+    prelations, {activity : [following activities], ...}
+    minimum, True to get the earliest start times, False to keep activities
+             not before previous_times
+    previous_times, {activity : start time, ...} of the previous schedule
+    root_activity, only this activity and its descendants are scheduled again
+                   (previous_times are kept for the rest)
+
+    The scheduler of the last prelations is reused while they do not change.
+    """
+    global _scheduler
+    if _scheduler == None or not _scheduler.has_prelations(activities, prelations):
+        _scheduler = ActivitiesScheduler(activities, prelations)
+    return _scheduler.start_times(durations, minimum, previous_times, root_activity)
 
 
 def mediaYvarianza(camino, actividad):
@@ -513,16 +657,98 @@ def mediaYvarianza(camino, actividad):
 
     return '%5.2f'%(d), '%5.2f'%(t)
 
-def pertFinal(actividad):
+# Grafos construidos por pertFinal: {estructura de precedencias : grafo}
+_pertCache = collections.OrderedDict()
+# Numero de grafos guardados en memoria
+PERT_CACHE_SIZE = 16
+# Carpeta de la cache en disco de pertFinal (None: no se usa)
+PERT_CACHE_DIR = None
+
+def precedenceKey(actividad):
+    """
+    Clave canonica de la estructura de precedencias de un proyecto (etiquetas
+    y siguientes de las actividades en orden, sin duraciones)
+    """
+    return tuple((act[1], tuple(act[2])) for act in actividad)
+
+def pertFinal(actividad, cacheDir=None):
     """
     Creacion del grafo Pert numerado en orden
-    Valor de retorno: grafoRenumerado (grafo final)
+
+    El grafo se guarda en memoria (y en cacheDir o PERT_CACHE_DIR si se
+    indica) con la estructura de precedencias como clave, por lo que solo se
+    construye de nuevo si cambian las precedencias.
+
+    Valor de retorno: grafoRenumerado (grafo final, copia que puede modificarse)
+    """
+    clave = precedenceKey(actividad)
+    if clave in _pertCache:
+        grafoRenumerado = _pertCache.pop(clave)
+    else:
+        directorio = cacheDir or PERT_CACHE_DIR
+        fichero = None
+        grafoRenumerado = None
+        if directorio:
+            resumen = hashlib.sha1('pertFinal-1' + repr(clave)).hexdigest()
+            fichero = os.path.join(directorio, resumen + '.pert')
+            grafoRenumerado = _loadPertCache(fichero)
+
+        if grafoRenumerado == None:
+            successors = dict(((act[1], act[2]) for act in actividad))
+            grafo = Pert()
+            grafo = grafo.construct(graph.successors2precedents(successors))
+            grafoRenumerado = grafo.renumerar()
+            if fichero:
+                _savePertCache(fichero, grafoRenumerado)
+
+    # Most recently used graphs are the last ones
+    _pertCache[clave] = grafoRenumerado
+    while len(_pertCache) > PERT_CACHE_SIZE:
+        _pertCache.popitem(last=False)
+    return copy.deepcopy(grafoRenumerado)
+
+def clearPertCache():
+    """
+    Olvida los grafos guardados en memoria por pertFinal
+    """
+    _pertCache.clear()
+
+def _loadPertCache(fichero):
     """
-    successors = dict(((act[1], act[2]) for act in actividad))
-    grafo = Pert()
-    grafo = grafo.construct(graph.successors2precedents(successors))
-    grafoRenumerado = grafo.renumerar()
-    return grafoRenumerado
+    Carga un grafo de la cache en disco (None si no esta o no es valido)
+    """
+    try:
+        with open(fichero, 'rb') as f:
+            grafo = cPickle.load(f)
+    except (IOError, EOFError, cPickle.UnpicklingError, AttributeError, ImportError, ValueError):
+        return None
+    if not isinstance(grafo, Pert):
+        return None
+    return grafo
+
+def _savePertCache(fichero, grafo):
+    """
+    Guarda un grafo en la cache en disco (escribe un fichero temporal y lo
+    renombra para que otros procesos nunca lean un fichero a medias)
+    """
+    try:
+        fd, temporal = tempfile.mkstemp(dir=os.path.dirname(fichero) or '.', suffix='.tmp')
+    except (IOError, OSError):
+        return # The cache is optional
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            cPickle.dump(grafo, f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(temporal, fichero)
+        temporal = None
+    except (IOError, OSError, cPickle.PicklingError, TypeError, RuntimeError):
+        pass # The cache is optional
+    finally:
+        # No se deja el fichero temporal si no se ha podido guardar
+        if temporal is not None:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
 
 
 #
@@ -55,8 +55,10 @@ import interface
 import fileFormats
 import assignment
 import kolmogorov_smirnov
+import critical_path
+import path_analysis
 from zaderenko import mZad, early, last
-from simAnnealing import simulated_annealing
+from simAnnealing import multi_start
 from simAnnealing import resources_availability
 from simAnnealing import resources_per_activities
 from simAnnealing import calculate_loading_sheet
@@ -66,6 +68,8 @@ import math
 #import pruebaInterface
 #import assignment
 
+# Maximum number of paths shown in the paths window (all of them may be exported to CSV)
+MAX_PATHS_SHOWN = 1000
 
 class PPCproject(object):
     """ Controler of global events in application """
@@ -1133,22 +1137,26 @@ Valor de retorno: unidadesRec (lista que contiene el recurso y la suma de
         # Se buscan las actividades que son crí­ticas, que serán aquellas cuya holgura total sea 0
         holguras = self.holguras(grafoRenumerado.arcs, tearly, tlast, []) 
         #print holguras, 'holguras'
-        actCriticas = self.actCriticas(holguras)
+        actCriticas = set(self.actCriticas(holguras))
         #print 'actividades criticas: ', actCriticas
-       
-        # Se crea un grafo sólo con las actividades crí­ticas y se extraen los caminos del grafo (todos serán crí­ticos)
-        caminosCriticos = self.grafoCriticas(actCriticas) 
-        #print caminosCriticos, 'caminos criticos'
 
-        # Get all paths removing 'begin' y 'end' from each path
+        # Se cuentan los caminos sin generarlos y solo se generan los más largos
+        # (by mean, without 'begin' and 'end'), so the critical ones come first
         successors = dict(((act[1], act[2]) for act in self.actividad))
         g = graph.roy(successors)
-        caminos = [c[1:-1]for c in graph.find_all_paths(g, 'Begin', 'End')]
+        numeroCaminos = path_analysis.count_paths(g)
+        medias = {}
+        varianzas = {}
+        for act in self.actividad:
+            medias[act[1]] = float(act[6]) if act[6] != '' else 0.0
+            varianzas[act[1]] = float(act[7])**2 if act[7] != '' else 0.0
+        caminos = [c for c, media, varianza in path_analysis.longest_paths(g, medias, varianzas,
+                                                                           k=MAX_PATHS_SHOWN)]
 
         #print 'caminos', caminos
 
-        # Se marca con 1 los caminos crí­ticos en todos los caminos del grafo, el resto se marca con 0
-        criticos = self.caminosCriticos(caminos, caminosCriticos)  
+        # Se marca con 1 los caminos crí­ticos (todas sus actividades son crí­ticas), el resto se marca con 0
+        criticos = [1 if actCriticas.issuperset(camino) else 0 for camino in caminos]
         #print criticos, 'vector criticos'
 
         # Se crea una lista con los caminos, sus duraciones y sus desviaciones tí­picas
@@ -1207,6 +1215,10 @@ Valor de retorno: unidadesRec (lista que contiene el recurso y la suma de
         column.add_attribute(cell, 'text', len(nodosN) + 2)
         column.set_min_width(50)
         self.mostrarCaminosZad(self.modeloZ, criticos, informacionCaminos)
+        titulo = _('Zaderenko and project paths')
+        if numeroCaminos > len(caminos):
+            titulo += ' (' + _('the %d longest paths of %d are shown') % (len(caminos), numeroCaminos) + ')'
+        self.vZaderenko.set_title(titulo)
         self.vZaderenko.hide()
         self.vZaderenko.show()
 
@@ -1268,91 +1280,6 @@ Valor de retorno: unidadesRec (lista que contiene el recurso y la suma de
         return criticas
 
   
-    def grafoCriticas(self, actCriticas):
-        """
-         Creación de un grafo sólo con actividades crí­ticas y extracción de
-                  los caminos de dicho grafo, que serán todos crí­ticos 
-
-          actCriticas: (lista de actividades crí­ticas)
-
-         Valor de retorno: caminosCriticos (lista de caminos crí­ticos)
-        """
-        # Se crea un grafo con las activididades crí­ticas y se extraen los caminos de dicho grafo, que serán crí­ticos
-        sucesorasCriticas = self.tablaSucesorasCriticas(actCriticas)
-        #print sucesorasCriticas, 'sucesorasCriticas'
-        gCritico = graph.roy(sucesorasCriticas)
-        #print gCritico, 'grafo critico'
-        caminosCriticos = []
-        caminos = graph.find_all_paths(gCritico, 'Begin', 'End')
-
-        # Se eliminan 'begin' y 'end' de todos los caminos
-        caminosCriticos=[c[1:-1]for c in caminos]
-
-        return caminosCriticos
-
-
-    def tablaSucesorasCriticas(self, criticas):
-        """
-         Obtiene un diccionario que contiene las actividades 
-                  crí­ticas y sus sucesoras  
-
-         Parámetros: criticas (lista de actividades crí­ticas)
-
-         Valor de retorno: sucesorasCriticas(diccionario que almacena 
-                           las actividades críticas y sus sucesoras)
-        """
-        cr = []
-        for n in criticas:
-            cr.append(n)
-        #print cr, 'criticas tabla'
-
-        sucesorasCriticas = {}
-        for n in cr:
-            for m in range(len(self.actividad)):
-                if n == self.actividad[m][1]:
-                    for a in self.actividad[m][2]:
-                        if a in cr:
-                            if n not in sucesorasCriticas:
-                                sucesorasCriticas[n] = [a]
-                            else:
-                                sucesorasCriticas[n].append(a)
-
-            if n not in sucesorasCriticas:  
-                sucesorasCriticas[n] = []
-
-        return sucesorasCriticas
-
-
-    def caminosCriticos(self, caminos, caminosCriticos):
-        """
-         Búsqueda de los caminos criticos en todos los caminos
-                  del grafo. Se marca con un 1 los crí­ticos y con un 0
-                  los no crí­ticos
-
-         Parámetros: caminos (lista todos los caminos)
-                     caminosCriticos (lista caminos criticos)
-
-         Valor de retorno: criticos (lista con los caminos marcados)
-        """
-        # Se buscan los caminos criticos entre todos los caminos y se marca en la lista con un 1
-        # Esta lista de 0 y 1 nos servirá para saber cuáles son los criticos a la hora de mostrarlos
-
-        # Inicializamos la lista a 0
-        criticos=[]
-        for n in range(len(caminos)):
-            c=0
-            criticos.append(c)
-
-        # Marcamos con 1 los que sean crí­ticos
-        for i in range(len(caminos)):
-            for j in range(len(caminosCriticos)):
-                if caminos[i]==caminosCriticos[j]:
-                    #print i, j, 'critico: ', caminosCriticos[j]
-                    criticos[i]=1
-
-        return criticos
-
-
     def mediaYdTipica(self, camino):
         """
          Cálculo de la duración media y la desviación tí­pica
@@ -1533,57 +1460,27 @@ Valor de retorno: unidadesRec (lista que contiene el recurso y la suma de
 
     def indiceCriticidad(self, grafo, duraciones, early, last, itTotales):
         """
-        Extrae los caminos crí­ticos, calcula su í­ndice de
-                    criticidad y muestra el resultado en la interfaz
+        Extrae los caminos crí­ticos de un lote de iteraciones simuladas, 
+                    calcula su í­ndice de criticidad y muestra el resultado en la interfaz
   
-        grafo (grafo Pert)
-        duraciones (duraciones simuladas)
-                early (lista con los tiempos early)
-                last (lista con los tiempos last)
+        grafo (critical_path.CompiledPert, grafo Pert compilado)
+        duraciones (matriz de duraciones simuladas, iteraciones x actividades)
+                early (matriz con los tiempos early de cada iteración)
+                last (matriz con los tiempos last de cada iteración)
         itTotales (iteraciones totales)
   
         Valor de retorno: - 
         """
-        #Se extraen los caminos crí­ticos
-        holguras = self.holguras(grafo.arcs, early, last, duraciones)  # Holguras de cada actividad
-        actCriticas = self.actCriticas(holguras)  # Se extraen las act. crí­ticas
-        criticos = self.grafoCriticas(actCriticas) # Se crea un grafo crí­tico y se extraen los caminos
-        
-        #print actCriticas, ' actCriticas'
-        
-        # Get all paths removing 'begin' y 'end' from each path
-        successors = dict(((act[1], act[2]) for act in self.actividad))
-        g = graph.roy(successors)
-        caminos = [c[1:-1]for c in graph.find_all_paths(g, 'Begin', 'End')]
-        #print caminos, ' caminos'
-        
-        # Se crea una lista con los caminos críticos de la simulación que son caminos del grafo original
-        caminosCriticos = []
-        for c in criticos:
-            if c in caminos:
-                caminosCriticos.append(c)
-        #print caminosCriticos, 'caminos criticos'
-  
-        # Se pasan todos los caminos a formato cadena
-        nuevosCaminos = []
-        for c in caminosCriticos:
-            s = ''
-            for m in c:
-                if s != '':
-                    s += ' -> '
-                    s += str(m)
-                else:
-                    s += str(m)
-            nuevo = [s]
-            nuevosCaminos.append(nuevo)
-            #print nuevosCaminos, 'formato'
-   
-        # Se establece la criticidad de cada camino
-        for c in nuevosCaminos:
-            if c[0] not in self.criticidad:
-                self.criticidad[c[0]] = 1
+        # Se extraen las act. crí­ticas de todas las iteraciones (holgura total 0)
+        criticas = grafo.critical_activities(duraciones, early, last)
+
+        # Se establece la criticidad de cada camino (en formato cadena)
+        for camino, n in grafo.path_criticality(criticas).items():
+            c = ' -> '.join([str(m) for m in camino])
+            if c not in self.criticidad:
+                self.criticidad[c] = n
             else:
-                self.criticidad[c[0]] += 1
+                self.criticidad[c] += n
         #print self.criticidad
 
         # Se muestran los caminos y el í­ndice de criticidad en la interfaz
@@ -2315,8 +2212,7 @@ Valor de retorno: unidadesRec (lista que contiene el recurso y la suma de
 
         elif menu_item == self._widgets.get_widget('algoritmoSharma'):
             # Creates Pert graph renumbered and creates SVG
-            grafo = algoritmoSharma.sharma1998ext( graph.successors2precedents(successors) )
-            grafoRenumerado = grafo.renumerar()
+            grafoRenumerado = pert.pertFinal(self.actividad)
             svg_text = graph.pert2image(grafoRenumerado)
             title = 'PERT graph Sharma'
 
@@ -2440,22 +2336,42 @@ Valor de retorno: unidadesRec (lista que contiene el recurso y la suma de
             self.dialogoError(_('A graph is needed to calculate its paths')) 
         else:
             successors = dict(((act[1], act[2]) for act in self.actividad))
-            roy = graph.roy(successors)
+            self.royCaminos = graph.roy(successors)
  
-            # Remove 'begin' and 'end' dummy activities from all paths
-            caminosSinBeginEnd=[c[1:-1]for c in graph.find_all_paths(roy, 'Begin', 'End')]
-            # Se preparan los caminos para mostrarlos en el interfaz
-            numeroCaminos = len(caminosSinBeginEnd) 
-            camino = _('Number of paths: ') + (str(numeroCaminos)) + '\n' 
-            for n in range(len(caminosSinBeginEnd)):
-                cadena = ', '.join(caminosSinBeginEnd[n])
-                camino += cadena
-                camino += '\n'
-           
-            # Se muestran los caminos en la interfaz
+            # Se cuentan los caminos sin generarlos y solo se genera la primera página
+            self.numeroCaminos = path_analysis.count_paths(self.royCaminos)
+            self.caminosMostrados = 0
+            self.cursorCaminos = None
+            self.mostrarPaginaCaminos()
             self.vCaminos.show()
-            widget=self._widgets.get_widget('tvCaminos')
-            self.mostrarTextView(widget, camino)
+
+    def mostrarPaginaCaminos(self):
+        """
+        Muestra la siguiente página de caminos (MAX_PATHS_SHOWN caminos a 
+        partir de self.cursorCaminos) en la ventana de calcular caminos
+        """
+        caminos, cursor = graph.paths_page(self.royCaminos, 'Begin', 'End', MAX_PATHS_SHOWN,
+                                           after=self.cursorCaminos)
+
+        # Se preparan los caminos para mostrarlos en el interfaz
+        # (removing 'begin' and 'end' dummy activities from all paths)
+        camino = _('Number of paths: ') + (str(self.numeroCaminos)) + '\n' 
+        if cursor or self.caminosMostrados:
+            camino += _('Paths from %d to %d:') % (self.caminosMostrados + 1, 
+                                                   self.caminosMostrados + len(caminos)) + '\n'
+        for c in caminos:
+            cadena = ', '.join(c[1:-1])
+            camino += cadena
+            camino += '\n'
+        if cursor:
+            camino += '... ' + _('(press Next paths to see the following ones, export to CSV to get all of them)') + '\n'
+        self.caminosMostrados += len(caminos)
+        self.cursorCaminos = cursor
+        self._widgets.get_widget('btSiguientesCaminos').set_sensitive(cursor is not None)
+       
+        # Se muestran los caminos en la interfaz
+        widget=self._widgets.get_widget('tvCaminos')
+        self.mostrarTextView(widget, camino)
 
 
 
@@ -2572,7 +2488,10 @@ Valor de retorno: unidadesRec (lista que contiene el recurso y la suma de
         else:
             noImproveIter = self.sbNoImproveIterSA.get_value()
 
-        self.optimumSchedule, optSchEvaluated, optSchDuration, optSchAlpha, optSchTemp, optSchIt = simulated_annealing(asignation,resources,successors,activities,leveling,nu,phi,minTemperature,maxIteration,noImproveIter)
+        # Execute the algorithm as many times as the user introduced (in 
+        # parallel chains) and keep the best schedule
+        result, statistics = multi_start(asignation,resources,successors,activities,leveling,nu,phi,minTemperature,maxIteration,noImproveIter,int(times))
+        self.optimumSchedule, optSchEvaluated, optSchDuration, optSchAlpha, optSchTemp, optSchIt = result
         
         if optSchDuration == 0:
             self.dialogoError(_('Project\'s duration = 0'))
@@ -2585,17 +2504,6 @@ Valor de retorno: unidadesRec (lista que contiene el recurso y la suma de
                 self.ganttSA.clear()
                 for a in self.actividad:
                     self.ganttSA.add_activity(a[1],[],float(a[6]),0,0,'Activity: ' + a[1])
-            # Execute the algorithm as many times as the user introduced
-            for a in range(0,int(times - 1)):
-                schedule, schEvaluated, schDuration, schAlpha, schTemp, schIt = simulated_annealing      (asignation,resources,successors,activities,leveling,nu,phi,minTemperature,maxIteration,noImproveIter)
-                # Save the best schedule
-                if optSchEvaluated > schEvaluated:
-                    self.optimumSchedule = schedule
-                    optSchEvaluated = schEvaluated
-                    optSchDuration = schDuration
-                    optSchAlpha = schAlpha
-                    optSchTemp = schTemp
-                    optSchIt = schIt
             # Show the value of algorithm's parameters
             self.entryResultSA.set_text(str(optSchDuration))
             self.entryAlpha.set_text(str(optSchAlpha))
@@ -3124,33 +3032,26 @@ Valor de retorno: unidadesRec (lista que contiene el recurso y la suma de
         totales.set_text(str(itTotales))
   
         # Se realiza la simulación
-        simulacion = simulation.simulacion(it, self.actividad)
-        self.simTotales += simulacion
+        try:
+            simulacion = simulation.simulate_durations(it, self.actividad)
+        except ValueError:
+            self.dialogoError(_('S Unknown distribution'))
+            return
+        self.simTotales += simulacion.tolist()
    
         # Se crea el grafo Pert y se renumera
         grafoRenumerado = pert.pertFinal(self.actividad)
   
-        # Nuevos nodos
-        nodosN = []
-        for n in range(len(grafoRenumerado.successors)):
-            nodosN.append(n+1)
-         
-        # Zaderenko
-        if simulacion == None:
-            return
-        else:
-            for s in simulacion: 
-                matrizZad = mZad(self.actividad, grafoRenumerado.arcs, nodosN, 0, s)
-                tearly = early(nodosN, matrizZad)
-                tlast = last(nodosN, tearly, matrizZad)      
-                tam = len(tearly)
-                # Se calcula la duración del proyecto para cada simulación
-                duracionProyecto = tearly[tam-1]
-                #print duracionProyecto, 'duracion proyecto'  
-                self.duraciones.append(duracionProyecto) 
-                #print self.duraciones,'duraciones simuladas'
-                # Se extraen los caminos crí­ticos y se calcula su í­ndice de criticidad
-                self.indiceCriticidad(grafoRenumerado, s, tearly, tlast, itTotales)
+        # Tiempos early y last de todas las iteraciones con el grafo compilado en arrays
+        grafoCompilado = critical_path.CompiledPert(grafoRenumerado, self.actividad)
+        tearly = grafoCompilado.early(simulacion)
+        tlast = grafoCompilado.last(simulacion, tearly)
+
+        # Se calcula la duración del proyecto para cada simulación
+        self.duraciones += tearly[:, -1].tolist()
+
+        # Se extraen los caminos crí­ticos y se calcula su í­ndice de criticidad
+        self.indiceCriticidad(grafoCompilado, simulacion, tearly, tlast, itTotales)
     
         # Se añaden la media y la desviación típica a la interfaz
         duracionMedia = numpy.mean(self.duraciones) 
@@ -3767,17 +3668,24 @@ Valor de retorno: unidadesRec (lista que contiene el recurso y la suma de
         """
         self.vCaminos.hide()
   
+    def on_btSiguientesCaminos_clicked(self, boton):
+        """
+        Acción usuario para ver la siguiente página de caminos
+        """
+        if self.cursorCaminos is not None:
+            self.mostrarPaginaCaminos()
+  
     def on_btExportarCsv_clicked(self, boton): 
         """
         Export paths to CSV format (for spreadsheet)
         """
-        # Generate all paths 
+        # Generate all paths (one by one while they are written)
         successors = dict(((act[1], act[2]) for act in self.actividad))
         g = graph.roy(successors)
-        todosCaminos = graph.find_all_paths(g, 'Begin', 'End')
+        todosCaminos = graph.iter_paths(g, 'Begin', 'End')
   
         # Create CSV and show file dialog
-        paths_csv = graph.roy_paths2csv([self.actividad[i][1] for i in range(len(self.actividad))], todosCaminos)
+        paths_csv = graph.roy_paths_csv_lines([self.actividad[i][1] for i in range(len(self.actividad))], todosCaminos)
         fileFormats.guardarCsv(paths_csv, self) 
   
     def on_wndCaminos_delete_event(self, ventana, evento):
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ Opt-in profiling of the steps of algorithms (module of PPC-PROJECT)
+
+ Algorithms mark the beginning of each of their steps with
+ profiling.step('Step 2'). Nothing is recorded unless a profile has been
+ started, so a disabled step costs a function call and a test:
+
+    profile = profiling.start()
+    pert_graph = algoritmoCohenSadeh.cohen_sadeh(prelations)
+    profiling.stop()
+    print profile.table()
+
+ Each step lasts until the next one begins or the profile is stopped. If a
+ step is run several times (e.g. inside a loop) its times are added.
+
+ The memory of a step is the growth of the resident set size of the process
+ from the beginning of the step to its end, or to the peak of the process if
+ a new peak is reached during the step. The resident set size is read from
+ /proc/self/statm; where it is not available only new peaks are measured.
+
+ Copyright 2007-15 Universidad de Córdoba
+ This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published
+   by the Free Software Foundation, either version 3 of the License,
+   or (at your option) any later version.
+ This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+ You should have received a copy of the GNU General Public License
+   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import time
+import resource
+import collections
+
+# Profile being recorded (None if profiling is disabled)
+_active = None
+
+# Size of a memory page in KB
+_PAGE_KB = resource.getpagesize() / 1024.0
+
+
+def resident_memory():
+    """
+    Current resident set size of the process in KB (the peak resident set
+    size if /proc/self/statm can not be read)
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(int(statm.read().split()[1]) * _PAGE_KB)
+    except (IOError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Profile(object):
+    """
+    Time and memory used by each step of a run
+
+        steps, {step name : [seconds, memory growth in KB], ...} in order
+               of first execution (the memory of a step run several times
+               is its greatest growth)
+    """
+    def __init__(self):
+        self.steps = collections.OrderedDict()
+        self._current = None
+        self._start_time = None
+        self._start_memory = None
+        self._start_peak = None
+
+    def step(self, name):
+        """
+        Ends the current step (if any) and begins step name
+        """
+        self.end()
+        self._current = name
+        self._start_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self._start_memory = resident_memory()
+        self._start_time = time.time()
+
+    def end(self):
+        """
+        Ends the current step (if any)
+        """
+        if self._current is None:
+            return
+        elapsed = time.time() - self._start_time
+        memory = resident_memory()
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if peak > self._start_peak:
+            # A new peak of the process was reached during the step
+            memory = max(memory, peak)
+        memory -= self._start_memory
+        record = self.steps.setdefault(self._current, [0.0, 0])
+        record[0] += elapsed
+        record[1] = max(record[1], memory)
+        self._current = None
+
+    def table(self):
+        """
+        Text with a line for each step: name, seconds, memory (KB)
+        """
+        return '\n'.join(['%-12s %10.4f s %8d KB' % (name, seconds, memory)
+                          for name, (seconds, memory) in self.steps.items()])
+
+    def __str__(self):
+        """
+        Compact text of the steps (as written in the benchmark table):
+            name=seconds/memory;name=seconds/memory;...
+        """
+        return ';'.join(['%s=%.6f/%d' % (name, seconds, memory)
+                         for name, (seconds, memory) in self.steps.items()])
+
+
+def start():
+    """
+    Starts recording a new profile (replacing the active one)
+
+    return: the Profile recorded
+    """
+    global _active
+    _active = Profile()
+    return _active
+
+def stop():
+    """
+    Stops recording the active profile
+
+    return: the Profile recorded (None if profiling was not started)
+    """
+    global _active
+    profile = _active
+    _active = None
+    if profile is not None:
+        profile.end()
+    return profile
+
+def step(name):
+    """
+    Marks the beginning of a step of an algorithm (does nothing if
+    profiling is not started)
+    """
+    if _active is not None:
+        _active.step(name)
@@ -7,6 +7,7 @@ The tests are:
     - If graph draw, have the nodes, arcs, and dummy required (validation_graph)
 
 Apart from test results, show: run time, number of arcs, number of dummy arcs, numbers of real arcs and number of nodes
+(and with --profile the time and memory used by each step of the algorithm)
 
 algorithms: list to include all algorithm to check.
 
@@ -19,6 +20,7 @@ import sys
 import traceback
 
 import graph
+import profiling
 import fileFormats
 import pert
 import Kahn1962
@@ -95,6 +97,8 @@ def main():
                         help='Draw the graph in a SVG file')
     parser.add_argument('--no-stop', action='store_true',
                         help='Do not stop when an algorithm fails')
+    parser.add_argument('--profile', action='store_true',
+                        help='Show time and memory of each step of the algorithms (added to the CSV line)')
 
     parser.add_argument('-c', '--CohenSadeh', action='store_true',
                         help='Test Cohen Sadeh algorithm')
@@ -173,6 +177,8 @@ def main():
 
                 # Run algorithm
                 pert_graph = None
+                if args.profile:
+                    profile = profiling.start()
                 itime = os.times()
                 for i in range(args.repeat):
                     try:
@@ -183,6 +189,7 @@ def main():
                         if not args.no_stop:
                             return 1
                         break
+                profiling.stop()
 
                 if pert_graph:
                     ftime = os.times()
@@ -196,6 +203,9 @@ def main():
                     print "numero de arcos reales: ", pert_graph.numArcsReales()
                     print "numero de arcos ficticios: ", pert_graph.numArcsFicticios()
                     print "numero de predecesors/sucesores: ", num_of_predecessors
+                    if args.profile:
+                        print "Steps (total of %d repetitions):" % (args.repeat, )
+                        print profile.table()
                     print "Validation: "
                     if not validation.check_validation(successors, pert_graph) and not args.no_stop:
                         return 1
@@ -205,6 +215,8 @@ def main():
                     result_line = '"' + filename + '",' + '"' + name + '",' + str(len(data)) + ',' + str(num_of_predecessors) + ',' + \
                         str(pert_graph.number_of_nodes()) + ',' + str(pert_graph.number_of_arcs()) + ',' + \
                         str(pert_graph.numArcsReales()) + ',' + str(pert_graph.numArcsFicticios()) + ',' + "%.4f"%(utime)
+                    if args.profile:
+                        result_line += ',"' + str(profile) + '"'
                     f_csv.write(result_line + "\n")
                     
                 if pert_graph == 1:
@@ -20,9 +20,32 @@
 #   along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import random
-import copy
+import __builtin__
+import heapq
+import time
+import multiprocessing
 from math import exp,log
+
+import numpy
+
 from graph import successors2precedents
+import pert
+import critical_path
+
+def resource_type(name):
+    """
+    Names a resource type may have in a project: translated (if gettext
+    _() is installed, as in the GUI) and as written in PSPLIB files
+
+    Parameters: name (type name in English)
+
+    Returned value: tuple of names
+    """
+    translate = getattr(__builtin__, '_', None)
+    if translate is None:
+        return (name,)
+    return (translate(name), name)
+
 
 def resources_availability(availableResources, flag = False):
     """
@@ -36,14 +59,17 @@ def resources_availability(availableResources, flag = False):
     Returned value: resources
     """
     resources={} 
+    renewable = resource_type('Renewable')
+    doubleConstrained = resource_type('Double constrained')
+    unlimited = resource_type('Unlimited')
    
     #Create a dictionary with the resources' name and number available   
     for a in availableResources:
-        if a[1] == _('Renewable'):
+        if a[1] in renewable:
             resources[a[0]] = a[3]
-        elif a[1] == _('Double constrained'):
+        elif a[1] in doubleConstrained:
             resources[a[0]] = a[2]
-        elif flag and a[1] == _('Unlimited'):
+        elif flag and a[1] in unlimited:
             resources[a[0]] = None
             
     return resources
@@ -70,6 +96,35 @@ def resources_per_activities(initialAsignation, resources):
                 asignation[act] = [(resource,amount)]
      
     return asignation
+
+
+def activities_last_time(actividad, slack=0):
+    """
+    Create a dictionary with the duration and the last
+          start time of each activity
+
+    Parameters: actividad (activities of the project, with their average duration)
+                slack (time added to the last start times)
+
+    Returned value: activities (dictionary of the activities and their 
+                    characteristics (duration, last time))
+    """
+    activities = {}
+    for a in actividad:
+        activities[a[1]] = [float(a[6])]
+
+    # Last times of the nodes of the PERT graph
+    grafoCompilado = critical_path.CompiledPert(pert.pertFinal(actividad), actividad)
+    durations = [activities[name][0] for name in grafoCompilado.names]
+    tlast = grafoCompilado.last(durations)[0]
+
+    for n in range(len(grafoCompilado.labels)):
+        label, dummy = grafoCompilado.labels[n]
+        if not dummy:
+            activities[label] += [tlast[grafoCompilado.destination[n]] + slack - activities[label][0]]
+
+    return activities
+
       
 def simulated_annealing(asignation,resources,successors,activities,leveling,nu,phi,minTemperature,maxIteration,numIterations):
     """
@@ -94,63 +149,279 @@ def simulated_annealing(asignation,resources,successors,activities,leveling,nu,p
                     tempAux (parameter to configure simulated annealing algorithm)
                     it (number of iterations done)
     """
-    predecessors = successors2precedents(successors)
+    chain = AnnealingChain(asignation,resources,successors,activities,leveling,nu,phi,minTemperature,maxIteration,numIterations)
+    chain.run()
+    return chain.result
 
-    for a in predecessors.copy():
-        if predecessors[a] == []:
-            del predecessors[a]
 
-    # sch1 will store the best plannings
-    schAux = sch1 = generate(asignation,resources.copy(),copy.deepcopy(predecessors),activities.copy(),leveling)
-    sch1Evaluated, loadSheet1, duration1 = evaluate(sch1,leveling,asignation,resources)
-    schAuxEvaluated = sch1Evaluated
-    durationAux = duration1
-    loadSheetAux = loadSheet1
-    
-    if duration1 == 0:
-        return (sch1, sch1Evaluated, duration1, None, None, None)
-    if sch1Evaluated == 0:
-        return (sch1, sch1Evaluated, duration1, None, None, 0)
-        
-    tempAux = temperature = (nu / -log(phi)) * sch1Evaluated
-    alpha = (minTemperature / temperature) ** (1 / maxIteration)
-    if alpha >= 1:
-        return (None,None,None,None,None,None)
-    it=0
-    numIterationsAux = numIterations
-    
-    while temperature > minTemperature and numIterations != 0:
-        it += 1
-        sch2 = modify(asignation,resources.copy(),copy.deepcopy(predecessors),activities.copy(),sch1,leveling)
-        sch2Evaluated, loadSheet2, duration2 = evaluate(sch2,leveling,asignation,resources)
-        if sch2Evaluated <= sch1Evaluated:
-            loadSheet1 = loadSheet2
-            duration1 = duration2
-            sch1 = sch2
-            sch1Evaluated = sch2Evaluated
-            # Set numIterations to initial value
-            numIterations = numIterationsAux 
+class AnnealingChain(object):
+    """
+    Simulated annealing of a project (see simulated_annealing) that can be
+    run in parts, so that several chains may exchange their best plannings
+
+        sch1, sch1Evaluated, duration1, current planning
+        schAux, schAuxEvaluated, durationAux, best planning left behind
+        temperature, tempAux (initial temperature), alpha, it (iterations done)
+        finished, True when the chain has stopped
+        result, tuple returned by simulated_annealing (once finished)
+        seed, seed of the random numbers of the chain (None to use the
+              random module as it is)
+        seconds, time running the chain
+    """
+    def __init__(self,asignation,resources,successors,activities,leveling,nu,phi,minTemperature,maxIteration,numIterations,seed=None):
+        """
+        Parameters: as simulated_annealing
+                    seed (seed of the random numbers of the chain, None to
+                          use the random module as it is)
+        """
+        self.asignation = asignation
+        self.resources = resources
+        self.leveling = leveling
+        self.minTemperature = minTemperature
+        self.numIterations = self.numIterationsAux = numIterations
+        self.it = 0
+        self.seed = seed
+        self.seconds = 0.0
+        self.finished = False
+        self.result = None
+        self.alpha = self.tempAux = None
+
+        self._randomState = None
+        if seed is not None:
+            saved = random.getstate()
+            random.seed(seed)
+        clock = time.time()
+
+        predecessors = successors2precedents(successors)
+        for a in predecessors.copy():
+            if predecessors[a] == []:
+                del predecessors[a]
+
+        self.generator = ScheduleGenerator(asignation,resources,predecessors,activities,leveling)
+
+        # sch1 will store the best plannings
+        self.schAux = self.sch1 = self.generator.generate()
+        self.sch1Evaluated, self.profile1, self.duration1 = evaluate_incrementally(self.sch1,leveling,asignation,resources)
+        self.schAuxEvaluated = self.sch1Evaluated
+        self.durationAux = self.duration1
+
+        self.seconds += time.time() - clock
+        if seed is not None:
+            self._randomState = random.getstate()
+            random.setstate(saved)
+
+        if self.duration1 == 0:
+            self._finish((self.sch1, self.sch1Evaluated, self.duration1, None, None, None))
+            return
+        if self.sch1Evaluated == 0:
+            self._finish((self.sch1, self.sch1Evaluated, self.duration1, None, None, 0))
+            return
+
+        self.tempAux = self.temperature = (nu / -log(phi)) * self.sch1Evaluated
+        self.alpha = (minTemperature / self.temperature) ** (1 / maxIteration)
+        if self.alpha >= 1:
+            self._finish((None,None,None,None,None,None))
+
+    def _finish(self, result):
+        self.finished = True
+        self.result = result
+        self.profile1 = None # Not needed any more (and heavy to pickle)
+
+    def best(self):
+        """
+        Best planning of the chain
+
+        Returned value: (sch, schEvaluated, duration)
+        """
+        if self.sch1Evaluated <= self.schAuxEvaluated:
+            return (self.sch1, self.sch1Evaluated, self.duration1)
         else:
-            numIterations -= 1 
+            return (self.schAux, self.schAuxEvaluated, self.durationAux)
+
+    def adopt(self, chain):
+        """
+        Continue from the best planning of other chain (the best planning
+        of this chain is kept)
+        """
+        if self.schAuxEvaluated > self.sch1Evaluated:
+            self.schAux, self.schAuxEvaluated, self.durationAux = self.sch1, self.sch1Evaluated, self.duration1
+        self.sch1, self.sch1Evaluated, self.duration1 = chain.best()
+        self.profile1 = evaluate_incrementally(self.sch1,self.leveling,self.asignation,self.resources)[1]
+        self.numIterations = self.numIterationsAux
+
+    def run(self, iterations=None):
+        """
+        Run the chain until it stops or the number of iterations is done
+
+        Parameters: iterations (None to run until the chain stops)
+
+        Returned value: finished (True if the chain has stopped)
+        """
+        if self.finished:
+            return True
+        if self._randomState is not None:
+            saved = random.getstate()
+            random.setstate(self._randomState)
+        clock = time.time()
+
+        asignation, resources, leveling = self.asignation, self.resources, self.leveling
+        generator, alpha = self.generator, self.alpha
+        sch1, sch1Evaluated, profile1, duration1 = self.sch1, self.sch1Evaluated, self.profile1, self.duration1
+        schAux, schAuxEvaluated, durationAux = self.schAux, self.schAuxEvaluated, self.durationAux
+        temperature, numIterations, numIterationsAux = self.temperature, self.numIterations, self.numIterationsAux
+        it = self.it
+        last = None
+        if iterations is not None:
+            last = it + iterations
+
+        while temperature > self.minTemperature and numIterations != 0 and it != last:
+            it += 1
+            # The random number to accept a worse planning is taken beforehand, so
+            # (if it allocates) a planning that cannot be accepted is not completed
             r = random.random()
-            m = exp(-(sch2Evaluated-sch1Evaluated) / temperature)
-            if r < m:
-                if schAuxEvaluated > sch1Evaluated:
-                    loadSheetAux = loadSheet1
-                    durationAux = duration1
-                    schAux = sch1 
-                    schAuxEvaluated = sch1Evaluated              
+            bound = None
+            if leveling == 0 and r > 0:
+                bound = sch1Evaluated - temperature * log(r)
+            sch2, cut = generator.neighbour(sch1, bound)
+            if sch2 is None:
+                numIterations -= 1
+                temperature = alpha * temperature
+                continue
+
+            sch2Evaluated, profile2, duration2 = evaluate_incrementally(sch2,leveling,asignation,resources,profile1,cut)
+            if sch2Evaluated <= sch1Evaluated:
+                profile1 = profile2
+                duration1 = duration2
                 sch1 = sch2
                 sch1Evaluated = sch2Evaluated
-                loadSheet1 = loadSheet2
-                duration1 = duration2   
-                    
-        temperature = alpha * temperature
+                # Set numIterations to initial value
+                numIterations = numIterationsAux 
+            else:
+                numIterations -= 1 
+                m = exp(-(sch2Evaluated-sch1Evaluated) / temperature)
+                if r < m:
+                    if schAuxEvaluated > sch1Evaluated:
+                        durationAux = duration1
+                        schAux = sch1 
+                        schAuxEvaluated = sch1Evaluated              
+                    sch1 = sch2
+                    sch1Evaluated = sch2Evaluated
+                    profile1 = profile2
+                    duration1 = duration2   
+                        
+            temperature = alpha * temperature
+
+        self.sch1, self.sch1Evaluated, self.profile1, self.duration1 = sch1, sch1Evaluated, profile1, duration1
+        self.schAux, self.schAuxEvaluated, self.durationAux = schAux, schAuxEvaluated, durationAux
+        self.temperature, self.numIterations, self.it = temperature, numIterations, it
+
+        if not (temperature > self.minTemperature and numIterations != 0):
+            if sch1Evaluated <= schAuxEvaluated:
+                self._finish((sch1, sch1Evaluated, duration1, alpha, self.tempAux, it))
+            else:
+                self._finish((schAux, schAuxEvaluated, durationAux, alpha, self.tempAux, it))
+
+        self.seconds += time.time() - clock
+        if self._randomState is not None:
+            self._randomState = random.getstate()
+            random.setstate(saved)
+        return self.finished
 
-    if sch1Evaluated <= schAuxEvaluated:
-        return (sch1, sch1Evaluated, duration1, alpha, tempAux, it)
-    else:
-        return (schAux, schAuxEvaluated, durationAux, alpha, tempAux, it)
+
+def chain_seeds(seed, chains):
+    """
+    Independent seeds for each chain derived from the master seed
+
+    seed (master seed, None to get them from the OS)
+    """
+    generator = random.Random(seed)
+    return [generator.randint(0, 2**31 - 1) for n in range(chains)]
+
+
+def _run_chain(job):
+    """
+    Run an annealing chain for a number of iterations (run by each worker process)
+
+    job (tuple with: AnnealingChain and number of iterations or None)
+
+    return: the AnnealingChain
+    """
+    chain, iterations = job
+    chain.run(iterations)
+    return chain
+
+
+def multi_start(asignation,resources,successors,activities,leveling,nu,phi,minTemperature,maxIteration,numIterations,
+                chains=1,workers=None,seed=None,exchange=None):
+    """
+    Run independent simulated annealing chains in a pool of processes and
+    keep the best schedule
+
+    Parameters: as simulated_annealing
+                chains (number of annealing chains)
+                workers (number of processes, None for as many as CPUs)
+                seed (master seed of the chains, the same seed gives the same
+                      results; None to get seeds from the OS)
+                exchange (every this number of iterations the chains continue
+                          from the best schedule found if it is better than
+                          their current one; None, 0 or less for
+                          independent chains)
+
+    Returned value: result (tuple returned by simulated_annealing for the best chain)
+                    statistics (list with a dictionary for each chain with its
+                                seed, evaluated, duration, iterations, alpha,
+                                temperature and seconds)
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = max(1, min(workers, chains))
+    if exchange is not None and exchange < 1:
+        exchange = None
+
+    chainList = [AnnealingChain(asignation,resources,successors,activities,leveling,nu,phi,
+                                minTemperature,maxIteration,numIterations,s)
+                 for s in chain_seeds(seed, chains)]
+
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+    try:
+        while not all(chain.finished for chain in chainList):
+            jobs = [(chain, exchange) for chain in chainList]
+            if pool:
+                chainList = pool.map(_run_chain, jobs)
+            else:
+                chainList = map(_run_chain, jobs)
+
+            # The chains continue from the best schedule if they are worse
+            running = [chain for chain in chainList if not chain.finished]
+            if exchange and running:
+                best = min(running, key=lambda chain: chain.best()[1])
+                for chain in running:
+                    if chain is not best and chain.sch1Evaluated > best.best()[1]:
+                        chain.adopt(best)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    statistics = []
+    for chain in chainList:
+        sch, schEvaluated, duration, alpha, tempAux, it = chain.result
+        statistics.append({'seed': chain.seed,
+                           'evaluated': schEvaluated,
+                           'duration': duration,
+                           'iterations': it,
+                           'alpha': alpha,
+                           'temperature': tempAux,
+                           'seconds': chain.seconds,
+                          })
+
+    # The best schedule (chains not started only if all failed)
+    results = [chain.result for chain in chainList if chain.result[0] is not None]
+    if not results:
+        return chainList[0].result, statistics
+    return min(results, key=lambda result: result[1]), statistics
 
 
 def generate(asignation,resources,predecessors,activities,leveling):
@@ -165,13 +436,8 @@ def generate(asignation,resources,predecessors,activities,leveling):
 
     Returned value: sch (planing generated)
     """
-       
-    currentTime = 0
-    executing = {}
-    result = []
-   
-    sch = generate_or_modify(asignation,resources,predecessors,activities,leveling,executing,result,currentTime)
-    return sch
+    generator = ScheduleGenerator(asignation,resources,predecessors,activities,leveling)
+    return generator.generate()
 
 
 def modify(asignation,resources,predecessors,activities,sch1,leveling):
@@ -187,35 +453,8 @@ def modify(asignation,resources,predecessors,activities,sch1,leveling):
 
     Returned value: sch (planning modified)
     """
-       
-    result = []
-    executing = {}
-   
-    # The modification will start at this time
-    currentTime = random.randint(0, int(sch1[-1][1]))
-   
-    # Update the state of result, executing, resources and activities to the state they would be at currentTime
-    for act,startTime,endTime in sch1:
-        if startTime < currentTime:
-            result += [(act,startTime,endTime)]
-            if startTime + activities[act][0] > currentTime:
-                executing[act] = startTime + activities[act][0] - currentTime
-                if act in asignation.keys() and leveling == 0:
-                    for resource,amount in asignation[act]:
-                        resources[resource] = float(resources[resource]) - float(amount)
-            activities.pop(act) 
-
-    # Update the state of predecessors to the state it would be at currentTime
-    for act,startTime,endTime in result:
-        if act not in executing:
-            for a in predecessors.copy():
-                if act in predecessors[a]: 
-                    predecessors[a].remove(act)
-                    if predecessors[a] == []:
-                        del predecessors[a] 
-      
-    sch = generate_or_modify(asignation,resources,predecessors,activities,leveling,executing,result,currentTime)
-    return sch
+    generator = ScheduleGenerator(asignation,resources,predecessors,activities,leveling)
+    return generator.modify(sch1)
 
 
 def evaluate(sch,leveling,asignation,resources):
@@ -250,57 +489,247 @@ def evaluate(sch,leveling,asignation,resources):
         variance = calculate_variance(resources,asignation,duration,loadSheet) 
         return (variance, loadSheet, duration)
 
+
+def evaluate_incrementally(sch,leveling,asignation,resources,previous=None,cut=None):
+    """
+    Evaluate a planning (as evaluate) reusing the loading of a previous
+    planning which is the same before a time
+
+    Parameters: sch (planning to evaluate)
+                leveling (if 0 it will consider resoucers)
+                asignation (returned by resourcesPerActivity)
+                resources (returned by resourcesAvailability)
+                previous (LoadingProfile of the previous planning or None)
+                cut (time until which sch and the previous planning are the same)
+
+    Returned value: duration or variance
+                    profile (LoadingProfile of sch, None if it allocates)
+                    duration
+    """
+    duration = 0
+    for act,startTime,endTime in sch:
+        if endTime > duration:
+            duration = endTime
+    
+    if duration == 0:
+        return (None, None, 0)
+
+    if leveling == 0: # if allocate
+        return (duration, None, duration)
+    else: #if leveling
+        profile = LoadingProfile(sch, resources, asignation, duration, previous, cut)
+        return (profile.variance(), profile, duration)
+
+
+def resources_demand(asignation, resources):
+    """
+    Amount of each resource required by the activities (if an activity
+    has a resource several times, only the first amount is considered)
+
+    Parameters: asignation (returned by resourcesPerActivity)
+                resources
+
+    Returned value: demand ({activity : [(resource, amount), ...], ...})
+    """
+    demand = {}
+    for act in asignation:
+        amounts = []
+        for resource in resources:
+            for r, a in asignation[act]:
+                if r == resource:
+                    amounts.append((resource, float(a)))
+                    break
+        demand[act] = amounts
+    return demand
+
+
 def calculate_loading_sheet (sch, resources, asignation, duration):
     """
     Calculate the loading sheet of sch
 
+    The loading of all the resources is calculated in a single pass over
+    the start and end times of the activities (sorted)
+
     Parameters: sch (schedule)
                 resources 
                 asignation
                 duration
                
-    Returned value: loadSheet
+    Returned value: loadSheet ({resource : [(time, amount), ...], ...} with a
+                    pair each time the amount of the resource changes)
     """
-        
-    startTime = []
-    endTime = []
+    demand = resources_demand(asignation, resources)
+
+    # Changes of loading at each time: [(resource, amount, activities), ...]
+    events = {}
+    for act,start,end in sch:
+        events.setdefault(start, [])
+        events.setdefault(end, [])
+        if act in demand:
+            for resource, amount in demand[act]:
+                events[start].append((resource, amount, 1))
+                events[end].append((resource, -amount, -1))
+
     loadSheet = {}
-        
-    for act in sch:
-        startTime.append(act[1])
-        endTime.append(act[2])
-    
-    for resource in resources:
-        startTimeCopy = copy.copy(startTime)
-        endTimeCopy = copy.copy(endTime)
-        time = min(min(startTimeCopy),min(endTimeCopy))      
-        while time != duration:
-            # remove activities with start time = current time
-            for a in copy.copy(startTimeCopy):
-                if a == time:
-                    startTimeCopy.remove(a)
-            # remove activities with end time = current time
-            for a in copy.copy(endTimeCopy):
-                if a == time:
-                    endTimeCopy.remove(a)
-            amount = 0        
-            for act,start,end in sch:
-                if time >= start and time < end and act in asignation.keys():
-                    for r, a in asignation[act]:
-                        if r == resource:
-                            amount += float(a)
-                            break
-            if resource in loadSheet.keys() and loadSheet[resource][-1][1] != amount:
-                loadSheet[resource] += [(time,amount)]
-            elif resource not in loadSheet.keys():
-                loadSheet[resource] = [(time,amount)]
-            
-            if startTimeCopy != []:    
-                time = min(min(startTimeCopy),min(endTimeCopy))
-            else:
-                time = min(endTimeCopy)
+    amount = dict((resource, 0) for resource in resources)
+    # Number of activities using each resource (when none, amount is exactly 0)
+    using = dict((resource, 0) for resource in resources)
+    for time in sorted(events):
+        if time >= duration:
+            break
+        changed = set()
+        for resource, a, n in events[time]:
+            amount[resource] += a
+            using[resource] += n
+            if using[resource] == 0:
+                amount[resource] = 0
+            changed.add(resource)
+
+        if not loadSheet:
+            for resource in resources:
+                loadSheet[resource] = [(time, amount[resource])]
+        else:
+            for resource in changed:
+                if loadSheet[resource][-1][1] != amount[resource]:
+                    loadSheet[resource].append((time, amount[resource]))
                 
     return loadSheet
+
+
+def calculate_loading_array (sch, resources, asignation, duration):
+    """
+    Calculate the loading of sch as a numpy array (see calculate_loading_sheet)
+
+    Parameters: sch (schedule)
+                resources 
+                asignation
+                duration
+               
+    Returned value: names (resources in the order of the rows)
+                    times (array with the times when the loading may change, before duration)
+                    loads ((resources x times) array with the amount of each
+                           resource from each time to the next one)
+    """
+    names = list(resources)
+    row = dict((resource, n) for n, resource in enumerate(names))
+    demand = resources_demand(asignation, resources)
+
+    times = numpy.unique([start for act,start,end in sch] + [end for act,start,end in sch])
+    times = times[times < duration]
+
+    return names, times, _step_loads(sch, row, demand, times)
+
+
+def _step_loads(sch, row, demand, times):
+    """
+    Loading of the resources from each time to the next one
+
+    Parameters: sch (schedule)
+                row ({resource : row in the array, ...})
+                demand (returned by resources_demand)
+                times (sorted array of times when the loading may change)
+
+    Returned value: (resources x times) array
+    """
+    rows = []
+    starts = []
+    ends = []
+    amounts = []
+    for act,start,end in sch:
+        for resource, amount in demand.get(act, []):
+            rows.append(row[resource])
+            starts.append(start)
+            ends.append(end)
+            amounts.append(amount)
+
+    # Changes of loading at each time (an extra column for the end), accumulated
+    loads = numpy.zeros((len(row), len(times) + 1))
+    rows = numpy.array(rows, dtype=int)
+    amounts = numpy.array(amounts, dtype=float)
+    numpy.add.at(loads, (rows, numpy.searchsorted(times, numpy.array(starts, dtype=float))), amounts)
+    numpy.add.at(loads, (rows, numpy.searchsorted(times, numpy.array(ends, dtype=float))), -amounts)
+    return loads.cumsum(axis=1)[:, :-1]
+
+
+class LoadingProfile(object):
+    """
+    Loading of the resources of a planning with the integrals needed by its
+    variance. A planning modified from a time can reuse the profile of the
+    original one up to that time, only the loading after it is integrated.
+
+        names, resources sorted (rows of the arrays)
+        times, array of the times when the loading may change (before duration)
+        loads, (resources x times) array with the amount of each resource
+               from each time to the next one
+        amount, square, (resources x times) arrays with the integral of the
+                loading and of the squared loading up to each time
+        duration, duration of the planning
+    """
+    def __init__(self, sch, resources, asignation, duration, previous=None, cut=None):
+        """
+        Parameters: sch (planning)
+                    resources (returned by resourcesAvailability)
+                    asignation (returned by resourcesPerActivity)
+                    duration (duration of the planning)
+                    previous (LoadingProfile of a planning equal to sch before cut)
+                    cut (time until which previous can be reused)
+        """
+        self.duration = duration
+        if previous is None or cut is None:
+            self.names = sorted(resources)
+            self._demand = resources_demand(asignation, resources)
+            cut = 0
+            k = 0
+        else:
+            self.names = previous.names
+            self._demand = previous._demand
+            k = numpy.searchsorted(previous.times, cut)
+        row = dict((resource, n) for n, resource in enumerate(self.names))
+
+        # Loading after cut (activities executing at cut start at cut)
+        suffix = [(act, max(startTime, cut), endTime) for act,startTime,endTime in sch if endTime > cut]
+        times = numpy.unique([cut] + [startTime for act,startTime,endTime in suffix] + 
+                             [endTime for act,startTime,endTime in suffix])
+        times = times[times < duration]
+        loads = _step_loads(suffix, row, self._demand, times)
+
+        # Integrals up to cut
+        amount0 = numpy.zeros(len(self.names))
+        square0 = numpy.zeros(len(self.names))
+        if k > 0:
+            width = cut - previous.times[k - 1]
+            amount0 = previous.amount[:, k - 1] + previous.loads[:, k - 1] * width
+            square0 = previous.square[:, k - 1] + previous.loads[:, k - 1] ** 2 * width
+
+        # Integrals after cut, up to each time
+        widths = numpy.diff(numpy.append(times, duration))
+        amount = numpy.hstack((amount0[:, numpy.newaxis], 
+                               amount0[:, numpy.newaxis] + numpy.cumsum(loads * widths, axis=1)))
+        square = numpy.hstack((square0[:, numpy.newaxis], 
+                               square0[:, numpy.newaxis] + numpy.cumsum(loads ** 2 * widths, axis=1)))
+        self.amount_total = amount[:, -1]
+        self.square_total = square[:, -1]
+        amount = amount[:, :len(times)]
+        square = square[:, :len(times)]
+
+        if k > 0:
+            self.times = numpy.concatenate((previous.times[:k], times))
+            self.loads = numpy.hstack((previous.loads[:, :k], loads))
+            self.amount = numpy.hstack((previous.amount[:, :k], amount))
+            self.square = numpy.hstack((previous.square[:, :k], square))
+        else:
+            self.times = times
+            self.loads = loads
+            self.amount = amount
+            self.square = square
+
+    def variance(self):
+        """
+        Variance of the planning (the average of all resources' variance, as calculate_variance)
+        """
+        duration = self.duration
+        variance = (self.square_total - self.amount_total ** 2 / duration) / (duration - 1)
+        return float(variance.sum()) / len(self.names)
     
       
 def calculate_variance(resources,asignation,duration, loadSheet): 
@@ -351,102 +780,369 @@ def generate_or_modify(asignation,resources,predecessors,activities,leveling,exe
                 predecessors (dictionary with activities and their predecessors)
                 activities (dictionary with the name of activities and their characteristics)
                 leveling (if 0 it will allocate else it will level)
-                possibles (dictionary of the activities which can execute at currentTime)
                 executing (dictionary of the activities which are executing at currentTime)
                 result (planning of the project up to currentTime)
                 currentTime (time when the algorithm starts to generate a new planning) 
 
     Returned value: result (planning calculated)
     """
-    possibles = {}
-    
-    lengthResources = len(resources)
-    if lengthResources == 0: 
-        lengthResources = -1 
-   
-    resourcesUsedUp = 0 
-   
-    while activities != {} or possibles != {}: # Until all the activities have finished
-        # Choose activities with no predecessors
-        for a in activities.copy():
-            if a not in predecessors.keys():
-                possibles[a] = activities.pop(a)
-      
-        if possibles != {}:           
-            # If it level, pop the activities with maximum time to start = currentTime 
+    generator = ScheduleGenerator(asignation,resources,predecessors,activities,leveling)
+    pending = {}
+    for a in activities:
+        pending[a] = len(generator.predecessors.get(a, []))
+    return generator.schedule(generator.available[:],pending,executing,result,currentTime)
+
+
+class ScheduleGenerator(object):
+    """
+    Random schedules of a project (see simulated_annealing)
+
+    Successors, number of predecessors and resource demands of the activities
+    are indexed once, so each schedule is generated with a heap of completion
+    events in O(n log n) (plus the random choices among the possible activities)
+
+    Random choices are always made among activities sorted by name (never in
+    the order of a set or a dictionary, which may change when the generator is
+    pickled), so the same random state gives the same schedule in any process.
+
+        names, resources' names
+        available, amount available of each resource (in the order of names)
+        demand, {activity : [(resource index, amount), ...], ...} (only if allocating)
+        predecessors, {activity : set of predecessors, ...}
+        successors, {activity : [successors sorted], ...}
+        activities, {activity : [duration, last start time], ...}
+        tail, {activity : longest path from the start of the activity to the end, ...}
+    """
+    def __init__(self,asignation,resources,predecessors,activities,leveling):
+        """
+        Parameters: asignation (returned by resourcesPerActivity)
+                    resources (returned by resourcesAvailability)
+                    predecessors (dictionary with activities and their predecessors)
+                    activities (dictionary with the name of activities and their characteristics)
+                    leveling (if 0 it will allocate else it will level)
+        """
+        self.leveling = leveling
+        self.activities = activities.copy()
+        self.names = list(resources)
+        self.available = [resources[resource] for resource in self.names]
+
+        self.demand = {}
+        if leveling == 0:
+            index = dict((resource, n) for n, resource in enumerate(self.names))
+            for act in asignation:
+                self.demand[act] = [(index[resource], float(amount)) for resource, amount in asignation[act]]
+
+        self.predecessors = {}
+        self.successors = {}
+        for act in predecessors:
+            if predecessors[act]:
+                self.predecessors[act] = set(predecessors[act])
+                for a in self.predecessors[act]:
+                    self.successors.setdefault(a, []).append(act)
+        for act in self.successors:
+            self.successors[act].sort()
+
+        # Longest paths to the end (in reverse topological order)
+        self.tail = {}
+        pending = dict((act, len(self.successors.get(act, []))) for act in self.activities)
+        ready = [act for act in self.activities if pending[act] == 0]
+        while ready:
+            act = ready.pop()
+            self.tail[act] = self.activities[act][0] + max([self.tail[a] for a in self.successors.get(act, [])] + [0])
+            for a in self.predecessors.get(act, []):
+                if a in pending:
+                    pending[a] -= 1
+                    if pending[a] == 0:
+                        ready.append(a)
+
+    def generate(self):
+        """
+        Generate a schedule
+
+        Returned value: sch (planing generated)
+        """
+        pending = {}
+        for act in self.activities:
+            pending[act] = len(self.predecessors.get(act, []))
+        return self.schedule(self.available[:], pending, {}, [], 0)
+
+    def modify(self, sch1):
+        """
+        Modify a planning generating it again from a random time
+
+        Parameters: sch1 (planning to modify)
+
+        Returned value: sch (planning modified)
+        """
+        return self.neighbour(sch1)[0]
+
+    def neighbour(self, sch1, bound=None):
+        """
+        Modify a planning generating it again from a random time
+
+        Parameters: sch1 (planning to modify)
+                    bound (the generation stops if the duration of the planning
+                           cannot be lower than bound, None to complete it)
+
+        Returned value: sch (planning modified, None if stopped)
+                        currentTime (time from which sch1 was modified)
+        """
+        result = []
+        executing = {}
+        available = self.available[:]
+
+        # The modification will start at this time
+        currentTime = random.randint(0, int(sch1[-1][1]))
+
+        # Update the state of result, executing and resources to the state they would be at currentTime
+        started = set()
+        for act,startTime,endTime in sch1:
+            if startTime < currentTime:
+                result.append((act,startTime,endTime))
+                started.add(act)
+                if startTime + self.activities[act][0] > currentTime:
+                    executing[act] = startTime + self.activities[act][0] - currentTime
+                    for resource,amount in self.demand.get(act, []):
+                        available[resource] = float(available[resource]) - amount
+
+        # Number of predecessors not finished at currentTime of the activities not started
+        pending = {}
+        for act in self.activities:
+            if act not in started:
+                pending[act] = len(self.predecessors.get(act, []))
+        for act in started:
+            if act not in executing:
+                for a in self.successors.get(act, []):
+                    if a in pending:
+                        pending[a] -= 1
+
+        return self.schedule(available, pending, executing, result, currentTime, bound), currentTime
+
+    def schedule(self, available, pending, executing, result, currentTime, bound=None):
+        """
+        Generate a planning from currentTime
+
+        Parameters: available (amount available of each resource at currentTime)
+                    pending (number of predecessors not finished of the activities not started)
+                    executing (dictionary of the activities which are executing at currentTime
+                               and their remaining time)
+                    result (planning of the project up to currentTime)
+                    currentTime (time when the algorithm starts to generate a new planning)
+                    bound (stop if the duration of the planning cannot be lower
+                           than bound, None to complete the planning)
+
+        Returned value: result (planning calculated, None if stopped)
+        """
+        activities = self.activities
+        demand = self.demand
+        leveling = self.leveling
+
+        lengthResources = len(available)
+        if lengthResources == 0: 
+            lengthResources = -1 
+        resourcesUsedUp = 0 
+
+        # Lower bound of the duration (start time + longest path to the end)
+        minDuration = 0
+        if bound is not None:
+            minDuration = max([startTime + self.tail[act] for act,startTime,endTime in result] + [0])
+
+        # Completion events: (elapsed time when the activity finishes, activity)
+        elapsed = 0
+        events = [(remaining, act) for act, remaining in executing.items()]
+        heapq.heapify(events)
+
+        # Activities with no predecessors pending, and (if it levels) by last start time
+        possibles = set()
+        lastStart = {}
+        def make_possible(act):
+            possibles.add(act)
             if leveling == 1:
-                for act in possibles.copy():
-                    if possibles[act][1] == currentTime:                   
-                        executing[act] = possibles[act][0]
-                        result += [(act, currentTime, currentTime + possibles[act][0])]
-                        del possibles[act]
-            # Calculate a number of activities to execute       
-            # A minimum of one activity has to be executing
-            if executing == {}:
-                numActivities = random.randint(1,len(possibles))
-            else:
-                numActivities = random.randint(0,len(possibles))
+                lastStart.setdefault(activities[act][1], []).append(act)
 
-            possiblesCopy = possibles.copy()
-            # Execute activities until a number of activities have executed, no more possibles activities or no more resources 
-            while numActivities != 0 and lengthResources != resourcesUsedUp:
-            
-                noExecute = 0
-
-                # Pop a random item of possiblesCopy
-                possiblesKeys = possiblesCopy.keys()
-                key = random.choice(possiblesKeys)
-                act = possiblesCopy.pop(key)
-                # If resources are required            
-                if key in asignation.keys() and leveling == 0:
-                    for resource,amount in asignation[key]:
+        def start(act):
+            possibles.discard(act)
+            heapq.heappush(events, (elapsed + activities[act][0], act))
+            result.append((act, currentTime, currentTime + activities[act][0]))
+            return currentTime + self.tail[act]
+
+        for act in sorted(pending):
+            if pending[act] == 0:
+                del pending[act]
+                make_possible(act)
+
+        while pending or possibles: # Until all the activities have started
+            if possibles:           
+                # If it level, execute the activities with maximum time to start = currentTime 
+                if leveling == 1:
+                    for act in lastStart.pop(currentTime, []):
+                        if act in possibles:
+                            minDuration = max(minDuration, start(act))
+                # Calculate a number of activities to execute       
+                # A minimum of one activity has to be executing
+                if not events:
+                    numActivities = random.randint(1,len(possibles))
+                else:
+                    numActivities = random.randint(0,len(possibles))
+
+                candidates = sorted(possibles)
+                # Execute activities until a number of activities have executed, no more possibles activities or no more resources 
+                while numActivities != 0 and lengthResources != resourcesUsedUp:
+                    # Pop a random candidate
+                    n = random.randrange(len(candidates))
+                    key = candidates[n]
+                    candidates[n] = candidates[-1]
+                    candidates.pop()
+                    # If resources are required            
+                    if key in demand:
                         # if resource required > resource available
-                        if float(amount) > float(resources[resource]):
-                            noExecute = 1
-                            break                     
-                    if noExecute == 0:
-                        for resource,amount in asignation[key]:
-                            resources[resource] = float(resources[resource]) - float(amount)
-                            if resources[resource] == 0:
-                                resourcesUsedUp += 1          
-                        executing[key] = act[0] # Add activity in executing
-                        result += [(key, currentTime, currentTime + act[0])] # Update result
-                        del possibles[key] # Remove the activity from possibles dictionary             
-                else: # The activity doesn't consumed any resource
-                    executing[key] = act[0]
-                    result += [(key, currentTime, currentTime + act[0])]
-                    del possibles[key] #remove the activity from possibles dictionary
-                
-                numActivities -= 1
+                        if all(amount <= float(available[resource]) for resource, amount in demand[key]):
+                            for resource,amount in demand[key]:
+                                available[resource] = float(available[resource]) - amount
+                                if available[resource] == 0:
+                                    resourcesUsedUp += 1          
+                            minDuration = max(minDuration, start(key))
+                    else: # The activity doesn't consumed any resource
+                        minDuration = max(minDuration, start(key))
+                    numActivities -= 1
 
-        time = min(executing.values())
-        if leveling == 0:
-            currentTime += time
-        else:
-            if time <= 1:
-                currentTime += time 
+                if bound is not None and minDuration >= bound:
+                    return None
+
+            time = events[0][0] - elapsed
+            if leveling == 0:
+                currentTime += time
+            else:
+                if time <= 1:
+                    currentTime += time 
+                else:
+                    time = 1
+                    currentTime = int(currentTime) + time
+            if time == events[0][0] - elapsed:
+                elapsed = events[0][0]
             else:
-                time = 1
-                currentTime = int(currentTime) + time
-        # Update the remaining time of all activities executing
-        for a in executing.copy():
-            executing[a] = float(executing[a]) - time
-            if executing[a] == 0:
-                del executing[a]
+                elapsed += time
+
+            # Finish the activities executing until the new time
+            while events and events[0][0] <= elapsed:
+                a = heapq.heappop(events)[1]
                 # Once one activity finish, update the resources' availability
-                if a in asignation.keys() and leveling == 0:
-                    for resource,amount in asignation[a]:
-                        if float(resources[resource]) == 0:
-                            resourcesUsedUp -= 1
-                        resources[resource] = float(resources[resource]) + float(amount)
-            
-                # If a was predecessor of any activity, update and remove the relation of predecessor
-                for act in predecessors.copy():
-                    if a in predecessors[act]:
-                        predecessors[act].remove(a)
-                        if predecessors[act]==[]:
-                            del predecessors[act]
+                for resource,amount in demand.get(a, []):
+                    if float(available[resource]) == 0:
+                        resourcesUsedUp -= 1
+                    available[resource] = float(available[resource]) + amount
+                # If a was predecessor of any activity, it may be executed
+                for act in self.successors.get(a, []):
+                    if act in pending:
+                        pending[act] -= 1
+                        if pending[act] == 0:
+                            del pending[act]
+                            make_possible(act)
               
-    return result
-    
+        return result
+
+
+def main(argv=None):
+    """
+    Search the best schedule of a project with simulated annealing chains
+    (see multi_start) and print it with the statistics of each chain
+
+    The program shall receive the following parameters for each console:
+        infile (project file, .ppc or PSPLIB .sm)
+        -l (level the resources instead of allocating them)
+        -c (number of annealing chains)
+        -w (number of worker processes, default: number of CPUs)
+        -s (master seed of the chains)
+        -e (iterations between exchanges of the best schedule, default: no exchange)
+        --nu, --phi, --min-temperature, --max-iteration, --no-improve, --slack
+           (parameters of the algorithm, as in the simulated annealing window)
+    """
+    # Parse arguments and options
+    parser = argparse.ArgumentParser(description='Search the best schedule of a project with simulated annealing')
+    parser.add_argument('infile', help='Project file (.ppc or .sm)')
+    parser.add_argument('--leveling', '-l', action='store_true',
+                        help='Level the resources (default: allocate them)')
+    parser.add_argument('--chains', '-c', default=1, type=int,
+                        help='Number of annealing chains (default: 1)')
+    parser.add_argument('--workers', '-w', default=None, type=int,
+                        help='Number of processes running chains (default: number of CPUs)')
+    parser.add_argument('--seed', '-s', default=None, type=int,
+                        help='Master seed of the chains (default: random)')
+    parser.add_argument('--exchange', '-e', default=None, type=int,
+                        help='Iterations between exchanges of the best schedule among chains (default: independent chains)')
+    parser.add_argument('--nu', default=0.9, type=float, help='Nu (default: 0.9)')
+    parser.add_argument('--phi', default=0.9, type=float, help='Phi (default: 0.9)')
+    parser.add_argument('--min-temperature', default=0.01, type=float, 
+                        help='Minimum temperature (default: 0.01)')
+    parser.add_argument('--max-iteration', default=1000.0, type=float, 
+                        help='Maximum number of iterations (default: 1000)')
+    parser.add_argument('--no-improve', default=100, type=int, 
+                        help='Iterations without improvement to stop, -1 to never stop (default: 100)')
+    parser.add_argument('--slack', default=0.0, type=float, 
+                        help='Slack added to the last start times when leveling (default: 0)')
+    args = parser.parse_args(argv)
+
+    if args.chains < 1:
+        print 'Number of chains must be > 0'
+        return 1
+
+    if args.exchange is not None and args.exchange < 1:
+        print 'Iterations between exchanges must be > 0'
+        return 1
+
+    formats = [fileFormats.PPCProjectFileFormat(), fileFormats.PSPProjectFileFormat()]
+    try:
+        data = fileFormats.load_with_some_format(args.infile, formats)
+    except IOError:
+        print 'ERROR: Reading project file', args.infile
+        return 1
+    if not data:
+        print 'ERROR: Unexpected format for file', args.infile
+        return 1
+    actividad, schedules, recurso, asignacion = data
+    for a in actividad:
+        if a[6] == '':
+            print 'ERROR: Activity', a[1], 'has no average duration'
+            return 1
+
+    leveling = 1 if args.leveling else 0
+    resources = resources_availability(recurso)
+    if leveling == 1 and resources == {}:
+        print 'ERROR: There are not renewable or double constrained resources'
+        return 1
+    asignation = resources_per_activities(asignacion, resources)
+    successors = dict(((act[1], act[2]) for act in actividad))
+    activities = activities_last_time(actividad, args.slack)
+
+    result, statistics = multi_start(asignation, resources, successors, activities, leveling, 
+                                     args.nu, args.phi, args.min_temperature, args.max_iteration, 
+                                     args.no_improve, args.chains, args.workers, args.seed, args.exchange)
+    schedule, evaluated, duration, alpha, temperature, it = result
+    if schedule is None:
+        print 'ERROR: Initial temperature not high enough'
+        return 1
+
+    print 'Duration:', duration
+    if leveling == 1:
+        print 'Variance:', evaluated
+    print 'Activity,Start,End'
+    for act, startTime, endTime in sorted(schedule, key=lambda item: (item[1], item[0])):
+        print '%s,%s,%s' % (act, startTime, endTime)
+
+    print
+    print 'Chain,Seed,Evaluated,Duration,Iterations,Alpha,Temperature,Seconds'
+    for n in range(len(statistics)):
+        s = statistics[n]
+        print '%d,%s,%s,%s,%s,%s,%s,%.3f' % (n + 1, s['seed'], s['evaluated'], s['duration'], 
+                                            s['iterations'], s['alpha'], s['temperature'], s['seconds'])
+    return 0
+
 
+# If the program is run directly
+if __name__ == '__main__': 
+    # Imports needed just for main()
+    import sys
+    import argparse
+    import fileFormats
+    # Run
+    sys.exit(main())
@@ -1,7 +1,7 @@
 #!/bin/bash
 #
 # Llama a simulate.py para simular todos los ficheros de una carpeta
-#
+# (los ficheros se reparten entre varios procesos, ver: python simulate.py batch -h)
 #
 
 FOLDER="$1"
@@ -10,14 +10,9 @@ shift 1
 if [ ! -d "${FOLDER}" ]; then
     echo "Uso:"
     echo "     ./simulador.sh <CARPETA_CON_PROBLEMAS> -i <Iteraciones> -p <Valor de percentil>"
-    echo " (para más info de los parametros: python simulate.py -h)"
+    echo " (para más info de los parametros: python simulate.py batch -h)"
 else
     # Simulate project files
-    for file in "${FOLDER}/"*.ppc; do
-        if [ -f "$file" ]; then
-            echo "Simulando ${file}"
-            python simulate.py $@ -t "${FOLDER}/00table.csv" "${file}" 
-        fi
-    done
+    python simulate.py batch "${FOLDER}" "$@" -t "${FOLDER}/00table.csv"
 fi
 
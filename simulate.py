@@ -6,6 +6,11 @@ Program to simulate and test distributions
 import operator
 import math
 import os.path
+import sys
+import glob
+import argparse
+import multiprocessing
+import collections
 
 import numpy
 
@@ -13,40 +18,107 @@ import graph
 import kolmogorov_smirnov
 import fileFormats
 import pert
-import zaderenko
+import critical_path
 import simulation
            
-def vectorDuraciones(it, actividad):
+def vectorDuraciones(it, actividad, workers=1, seed=None):
     """
     Function performing the simulation of the project durations.
 
     it (number of iterations to be performed)
     actividad (vector with activities of the project and their durations)
+    workers (number of processes among which iterations are split)
+    seed (master seed, the same seed and workers give the same results)
 
-    return: duraciones (vector with all durations resulting from the simulation)
+    return: duraciones (array with all durations resulting from the simulation),
+            simulaciones (array with the simulated activity durations of each iteration),
+            grafoRenumerado (PERT graph of the project)
     """
-    
-    # Se simulan las duraciones de las actividades y se genera el grafo del proyecto.    
-    simulaciones = simulation.simulacion(it, actividad)
+    # Se genera el grafo del proyecto una sola vez y se reparten las iteraciones.
     grafoRenumerado = pert.pertFinal(actividad)
-    nodosN = []
+    grafoCompilado = critical_path.CompiledPert(grafoRenumerado, actividad)
+    trabajos = [(n, actividad, grafoCompilado, s) for n, s in
+                zip(split_iterations(it, workers), worker_seeds(seed, workers))]
 
-    for n in range(len(grafoRenumerado.successors)):
-        nodosN.append(n+1)
-
-    # Realizamos la simulacion de la duracion del proyecto aplicando la matriz de Zaderenko.
-    duraciones = []
-    if simulaciones == None:
-        return
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            resultados = pool.map(simulate_chunk, trabajos)
+        finally:
+            pool.close()
+            pool.join()
     else:
-        for s in simulaciones: 
-            matrizZad = zaderenko.mZad(actividad, grafoRenumerado.arcs, nodosN, 0, s)
-            tearly = zaderenko.early(nodosN, matrizZad)
-            duracionProyecto = tearly[-1]
-            duraciones.append(duracionProyecto)
-            
+        resultados = [simulate_chunk(trabajos[0])]
+
+    # Se unen los resultados en el orden de los procesos
+    duraciones = numpy.concatenate([r[0] for r in resultados])
+    simulaciones = numpy.concatenate([r[1] for r in resultados])
     return duraciones, simulaciones, grafoRenumerado
 
+
+def simulate_chunk(job):
+    """
+    Simulates a part of the iterations (run by each worker process)
+
+    job (tuple with: number of iterations, activities, critical_path.CompiledPert 
+         graph of the project and seed)
+
+    return: (durations, simulations) arrays of the iterations simulated
+    """
+    it, actividad, grafoCompilado, seed = job
+    simulaciones = simulation.simulate_durations(it, actividad, seed)
+    duraciones = grafoCompilado.project_durations(simulaciones)
+    return duraciones, simulaciones
+
+
+def split_iterations(it, workers):
+    """
+    Splits the iteration budget among workers (first ones may get one more)
+    """
+    return [it // workers + (1 if w < it % workers else 0) for w in range(workers)]
+
+
+def worker_seeds(seed, workers):
+    """
+    Independent seeds for each worker derived from the master seed
+
+    seed (master seed, None to get them from the OS)
+    """
+    return numpy.random.RandomState(seed).randint(0, 2**31 - 1, size=workers).tolist()
+
+
+def simulate_streaming(it, actividad, chunk_size, seed=None, binary_file=None):
+    """
+    Simulation of the project durations processing iterations in chunks, so
+    memory used does not depend on the number of iterations.
+
+    it (number of iterations to be performed)
+    actividad (vector with activities of the project and their durations)
+    chunk_size (number of iterations simulated at once)
+    seed (seed of the simulation, results also depend on chunk_size)
+    binary_file (open file to write durations as float64 values while simulating, 
+                 may be read with numpy.fromfile)
+
+    return: estadisticas (simulation.OnlineStatistics of project durations),
+            grafoRenumerado (PERT graph of the project)
+    """
+    grafoRenumerado = pert.pertFinal(actividad)
+    grafoCompilado = critical_path.CompiledPert(grafoRenumerado, actividad)
+    rng = simulation.random_generator(seed)
+    estadisticas = simulation.OnlineStatistics()
+
+    hechas = 0
+    while hechas < it:
+        n = min(chunk_size, it - hechas)
+        simulaciones = simulation.simulate_durations(n, actividad, rng)
+        duraciones = grafoCompilado.project_durations(simulaciones)
+        estadisticas.update(duraciones)
+        if binary_file:
+            duraciones.tofile(binary_file)
+        hechas += n
+
+    return estadisticas, grafoRenumerado
+
         
 def main():
     """
@@ -60,6 +132,11 @@ def main():
         table_file (name of the file in charge of saving the n simulations of the durations of the activities,
                   the distribution to generate them will be that uploaded from durationsfile)
         -i (number of iterations to be performed)
+        -w (number of worker processes to split the iterations among)
+        -s (master seed to make the simulation repeatable)
+        -c (streaming mode: iterations simulated at a time, only summary statistics are 
+            written to table_file and durations are not kept in memory)
+        -b (streaming mode: name of the file to write durations as binary float64 values)
     """
     # Parse arguments and options
     parser = argparse.ArgumentParser(description='Generates activities and project simulations')
@@ -73,6 +150,15 @@ def main():
                         help='Number of iterations (default: 1000)')
     parser.add_argument('-p', default=90, type=int, 
            help='Percentil de caminos criticos considerados de la simulacion (default: 90)')
+    parser.add_argument('--workers', '-w', default=1, type=int,
+                        help='Number of processes to split iterations among (default: 1)')
+    parser.add_argument('--seed', '-s', default=None, type=int,
+                        help='Master seed, results are repeatable for the same seed and workers (default: random)')
+    parser.add_argument('--chunk-size', '-c', default=None, type=int,
+                        help='Streaming mode: simulate this number of iterations at a time and only keep '
+                             'summary statistics (default: not streaming)')
+    parser.add_argument('--binary-file', '-b', default=None,
+                        help='Streaming mode: name of file to store durations as float64 binary values')
 
     args = parser.parse_args()
 
@@ -84,68 +170,282 @@ def main():
         print 'The argument p must be greater than 0'
         return 1
 
+    if args.workers < 1:
+        print 'Number of workers must be > 0'
+        return 1
+
+    if args.chunk_size is not None:
+        if args.chunk_size < 1:
+            print 'Chunk size must be > 0'
+            return 1
+        if args.workers > 1:
+            print 'Streaming mode can not be used with several workers'
+            return 1
+    elif args.binary_file:
+        print 'Binary file can only be used in streaming mode (--chunk-size)'
+        return 1
+
     if args.durations_file:
         durations_file = args.durations_file 
     else:
         durations_file = args.infile + '_simulation.csv'
 
-    # Load the project of the ppcproject
-    format = fileFormats.PPCProjectFileFormat()
+    # Load, simulate and evaluate the project
     try:
-        data = format.load(args.infile)
-        if not data:
-            print 'ERROR: Unexpected format for file ', args.infile
-            return 1
+        if args.chunk_size:
+            resultados = simulate_project_streaming(args.infile, args.i, args.chunk_size,
+                                                    args.binary_file, args.seed)
+        else:
+            resultados = simulate_project(args.infile, args.i, args.p, durations_file,
+                                          args.workers, args.seed)
     except fileFormats.InvalidFileFormatException:
         print 'ERROR: Unexpected format for file ', args.infile
         return 1
     except IOError:
         print 'ERROR: Reading project file\n'
         return 1
-    act, schedules, recurso, asignacion = data
-
-    # Simulate project
-    durations, simulation_act, graph = vectorDuraciones(args.i, act)
-
-    # Save durations in csv format
-    with open(durations_file, 'w') as f:
-        simulation_csv = ''
-        for dur in durations:
-            f.write(str(dur) + '\n')
-
-    # Create the result vector to be saved in the file
-    resultados = kolmogorov_smirnov.evaluate_models(act, durations, simulation_act, 
-                                                    args.p, pert_graph=graph)
 
     # Save the results
     if args.table_file:
         if (not os.path.isfile(args.table_file)):
             # Create and write header
             results_table_file = open(args.table_file, 'w')
-            header = "'Archivo', " + str( resultados.keys() )[1:-1] + '\n'
-            header = header.replace("'", '"')
-            results_table_file.write(header)
+            results_table_file.write(results_header(resultados))
         else:
             # Append data to the end
             results_table_file = open(args.table_file, 'a')
     else:
         results_table_file = sys.stdout
 
-    # Write values comma separated
-    s = str(args.infile) 
+    results_table_file.write(results_row(args.infile, resultados))
+    results_table_file.close()
+    return 0
+
+
+def simulate_project(infile, it, percentil, durations_file=None, workers=1, seed=None):
+    """
+    Loads a .ppc project, simulates it and tests the models with the simulation
+
+    infile (name of the project file)
+    it (number of iterations to be performed)
+    percentil (percentile of critical paths considered, see evaluate_models)
+    durations_file (name of the file to store durations list, None to not save them)
+    workers, seed (see vectorDuraciones)
+
+    raise: fileFormats.InvalidFileFormatException or IOError if the project can not be read
+    return: resultados (dictionary with all attributes and test results)
+    """
+    act = load_project(infile)
+
+    # Simulate project
+    durations, simulation_act, graph = vectorDuraciones(it, act, workers, seed)
+
+    # Save durations in csv format
+    if durations_file:
+        with open(durations_file, 'w') as f:
+            for dur in durations.tolist():
+                f.write(str(dur) + '\n')
+
+    # Create the result vector to be saved in the file
+    return kolmogorov_smirnov.evaluate_models(act, durations, simulation_act, 
+                                              percentil, pert_graph=graph)
+
+
+# Quantiles of the project duration reported in streaming mode
+STREAMING_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+def simulate_project_streaming(infile, it, chunk_size, binary_durations_file=None, seed=None):
+    """
+    Loads a .ppc project and simulates it in streaming mode (see simulate_streaming)
+
+    infile (name of the project file)
+    it (number of iterations to be performed)
+    chunk_size (number of iterations simulated at once)
+    binary_durations_file (name of the file to store durations as float64 values or None)
+    seed (seed of the simulation)
+
+    raise: fileFormats.InvalidFileFormatException or IOError if the project can not be read
+    return: resultados (dictionary with summary statistics of the simulation)
+    """
+    act = load_project(infile)
+
+    if binary_durations_file:
+        with open(binary_durations_file, 'wb') as f:
+            estadisticas, graph = simulate_streaming(it, act, chunk_size, seed, f)
+    else:
+        estadisticas, graph = simulate_streaming(it, act, chunk_size, seed)
+
+    resultados = collections.OrderedDict()
+    resultados['n_nodes'] = len(graph.successors)
+    resultados['n_activ'] = len(act)
+    resultados['iterations'] = estadisticas.n
+    resultados['meanSimulation'] = estadisticas.mean
+    resultados['sigmaSimulation'] = estadisticas.std()
+    resultados['minSimulation'] = estadisticas.min
+    resultados['maxSimulation'] = estadisticas.max
+    for q in STREAMING_QUANTILES:
+        resultados['q%02dSimulation' % (100 * q)] = estadisticas.quantile(q)
+    return resultados
+
+
+def load_project(infile):
+    """
+    Loads the activities of a .ppc project file
+
+    raise: fileFormats.InvalidFileFormatException or IOError if the project can not be read
+    """
+    format = fileFormats.PPCProjectFileFormat()
+    data = format.load(infile)
+    if not data:
+        raise fileFormats.InvalidFileFormatException('Unexpected format')
+    act, schedules, recurso, asignacion = data
+    return act
+
+
+def results_header(resultados):
+    """
+    Header line of the results table (names of the results)
+    """
+    header = "'Archivo', " + str( resultados.keys() )[1:-1] + '\n'
+    return header.replace("'", '"')
+
+
+def results_row(infile, resultados):
+    """
+    Line of the results table with the values comma separated
+    """
+    s = str(infile) 
     for res in resultados.values():
         s += ',' + res.__repr__().replace("'", '"') # Use doble quote to enclose strings
     s += '\n'
+    return s
 
-    results_table_file.write(s)
-    results_table_file.close()
-    return 0
+
+def simulate_job(job):
+    """
+    Simulates a project file of a batch (run by each worker process)
+
+    job (tuple with: project file name, iterations, percentil, seed and 
+         folder of the PERT graph cache or None)
+
+    return: (project file name, results dictionary or None, error message or None)
+    """
+    infile, it, percentil, seed, graph_cache = job
+    pert.PERT_CACHE_DIR = graph_cache
+    try:
+        resultados = simulate_project(infile, it, percentil, infile + '_simulation.csv', 1, seed)
+    except fileFormats.InvalidFileFormatException:
+        return infile, None, 'ERROR: Unexpected format for file ' + infile
+    except IOError:
+        return infile, None, 'ERROR: Reading project file ' + infile
+    except Exception, e:
+        return infile, None, 'ERROR: Simulating ' + infile + ': ' + repr(e)
+    return infile, resultados, None
+
+
+def batch_main(argv=None):
+    """
+    Batch simulation of all the project files in a folder (or matching glob patterns).
+
+    Each project file is loaded and simulated once by a process of a pool. Results 
+    are appended to the table file by this process only, in the order of the files,
+    so rows of parallel workers never get mixed. Durations are saved in 
+    <project file>_simulation.csv as in main().
+
+    The program shall receive the following parameters for each console:
+        projects (folders with .ppc files or glob patterns of project files)
+        table_file (name of the file to append test results, 
+                    default: <folder>/00table.csv if one folder is given, otherwise stdout)
+        -i (number of iterations to be performed)
+        -p (percentil of critical paths considered)
+        -w (number of worker processes, default: number of CPUs)
+        -s (seed used to simulate every project)
+        -g (folder to cache PERT graphs, so they are not constructed again for
+            projects already simulated)
+    """
+    # Parse arguments and options
+    parser = argparse.ArgumentParser(prog='simulate.py batch',
+                                     description='Simulates all the project files in a folder')
+    parser.add_argument('projects', nargs='+',
+                        help='Folder with .ppc project files or glob pattern of project files')
+    parser.add_argument('--table-file', '-t', default=None,
+                        help='Name of file to append test results (default: <folder>/00table.csv)')
+    parser.add_argument('-i', default=1000, type=int,
+                        help='Number of iterations (default: 1000)')
+    parser.add_argument('-p', default=90, type=int, 
+           help='Percentil de caminos criticos considerados de la simulacion (default: 90)')
+    parser.add_argument('--workers', '-w', default=multiprocessing.cpu_count(), type=int,
+                        help='Number of processes simulating files (default: number of CPUs)')
+    parser.add_argument('--seed', '-s', default=None, type=int,
+                        help='Seed used to simulate each project (default: random)')
+    parser.add_argument('--graph-cache', '-g', default=None,
+                        help='Folder to cache the PERT graphs of the projects (default: no cache)')
+
+    args = parser.parse_args(argv)
+
+    if args.i < 1:
+        print 'Number of iterations must be > 0'
+        return 1
+
+    if (args.p <= 0):
+        print 'The argument p must be greater than 0'
+        return 1
+
+    if args.workers < 1:
+        print 'Number of workers must be > 0'
+        return 1
+
+    if args.graph_cache and not os.path.isdir(args.graph_cache):
+        os.makedirs(args.graph_cache)
+
+    # Project files to simulate
+    infiles = []
+    for pattern in args.projects:
+        if os.path.isdir(pattern):
+            infiles += sorted(glob.glob(os.path.join(pattern, '*.ppc')))
+        else:
+            infiles += sorted(f for f in glob.glob(pattern) if os.path.isfile(f))
+    if not infiles:
+        print 'ERROR: No project files found'
+        return 1
+
+    table_file = args.table_file
+    if not table_file and len(args.projects) == 1 and os.path.isdir(args.projects[0]):
+        table_file = os.path.join(args.projects[0], '00table.csv')
+
+    if table_file:
+        write_header = not os.path.isfile(table_file)
+        results_table_file = open(table_file, 'a')
+    else:
+        write_header = False
+        results_table_file = sys.stdout
+
+    # Simulate files in parallel and write results from this process
+    jobs = [(infile, args.i, args.p, args.seed, args.graph_cache) for infile in infiles]
+    pool = multiprocessing.Pool(min(args.workers, len(jobs)))
+    errors = 0
+    try:
+        for infile, resultados, error in pool.imap(simulate_job, jobs):
+            if error:
+                print >> sys.stderr, error
+                errors += 1
+                continue
+            if write_header:
+                results_table_file.write(results_header(resultados))
+                write_header = False
+            results_table_file.write(results_row(infile, resultados))
+            results_table_file.flush()
+    finally:
+        pool.close()
+        pool.join()
+        if results_table_file is not sys.stdout:
+            results_table_file.close()
+
+    return 1 if errors else 0
 
 # If the program is run directly
 if __name__ == '__main__': 
-    # Imports needed just for main()
-    import sys
-    import argparse
-    # Run
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        sys.exit(batch_main(sys.argv[2:]))
     sys.exit(main())
 
@@ -22,6 +22,8 @@
 import random
 import math
 
+import numpy
+
 #import scipy.stats
 
 def calcularFrecuencias(duraciones, dMax, dMin, itTotales, N):
@@ -241,7 +243,223 @@ def simulacion(n, activities):
         simulacion.append(sim)
     
     return simulacion
-    
+
+
+# Order in which distribution groups draw their random numbers (keeps a seeded
+# simulation reproducible)
+DISTRIBUTIONS = ['Beta', 'Triangular', 'Uniform', 'Normal']
+
+def random_generator(seed=None):
+    """
+    Returns the numpy random number generator to be used in a simulation
+
+     seed: None (seeded by numpy from the OS), an integer or an already
+           created numpy.random.RandomState (returned as it is)
+    """
+    if isinstance(seed, numpy.random.RandomState):
+        return seed
+    return numpy.random.RandomState(seed)
+
+
+def simulate_durations(n, activities, seed=None, as_list=False):
+    """
+    Simulate duration of every activity according to its distribution type
+    (vectorized version of simulacion())
+
+    All the iterations of the activities sharing a distribution type are drawn
+    in one pass. Distributions are the same as in simulacion(), but random
+    numbers come from numpy instead of the random module.
+
+     n: number of simulation rows to generate
+     activities: list of activities each of them with activity structure
+     seed: seed or numpy.random.RandomState to draw random numbers from
+     as_list: if True the old simulacion() list of lists is returned
+
+     return: float64 array with shape (n, len(activities)), row i holds the
+             durations simulated in iteration i for every activity
+             (or [ [simulated_duration_a, simulated_duration_b, ... ], ... ]
+             if as_list)
+    """
+    TOLERANCE = 0.001
+    rng = random_generator(seed)
+    simulacion = numpy.empty((n, len(activities)))
+
+    # Group activities by distribution, constant durations are set directly
+    groups = dict((dist, []) for dist in DISTRIBUTIONS)
+    for col, activity in enumerate(activities):
+        pos, name, follow, opt, most, pes, mean, std_dev, distribution = activity[0:9]
+        if distribution not in groups:
+            raise ValueError('Unknown distribution: ' + str(distribution))
+
+        if distribution == 'Normal':
+            if std_dev < TOLERANCE:
+                simulacion[:, col] = mean
+            else:
+                groups[distribution].append((col, mean, std_dev, 0))
+        elif opt == pes:
+            simulacion[:, col] = opt
+        else:
+            groups[distribution].append((col, opt, most, pes))
+
+    for distribution in DISTRIBUTIONS:
+        if not groups[distribution]:
+            continue
+        cols, a, b, c = [numpy.array(v) for v in zip(*groups[distribution])]
+        a = a.astype(float)
+        b = b.astype(float)
+        c = c.astype(float)
+        size = (n, len(cols))
+
+        if distribution == 'Uniform':
+            valores = rng.uniform(a, c, size)
+
+        elif distribution == 'Beta':
+            shape_a = 1 + 4.0 * (b - a) / (c - a)
+            shape_b = 1 + 4.0 * (c - b) / (c - a)
+            valores = rng.beta(shape_a, shape_b, size) * (c - a) + a
+
+        elif distribution == 'Triangular':
+            # Inverse of the distribution function (as generaAleatoriosTriangular)
+            unif = rng.random_sample(size)
+            left = unif <= (b - a) / (c - a)
+            valores = numpy.where(left,
+                                  a + numpy.sqrt(unif * (c - a) * (b - a)),
+                                  c - numpy.sqrt((c - a) * (c - b) * (1 - unif)))
+
+        else: # Normal (a: mean, b: standard deviation)
+            valores = rng.normal(a, b, size)
+
+        simulacion[:, cols] = valores
+
+    if as_list:
+        return simulacion.tolist()
+    return simulacion
+
+
+class OnlineStatistics(object):
+    """
+    Statistics of a stream of values (e.g. project durations) updated chunk by
+    chunk using constant memory
+
+        n, number of values seen
+        mean, min, max: of the values seen
+        lo, width, counts: histogram with a fixed number of bins of equal width
+                           starting at lo, used as sketch to estimate quantiles
+
+    The histogram range grows by merging pairs of bins (doubling the width)
+    whenever a value falls outside it, so quantile estimates have an error
+    lower than the width of a bin (range of the values / number of bins).
+    """
+    def __init__(self, bins=1000):
+        """
+        bins: number of bins of the histogram (rounded up to an even number)
+        """
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0   # Sum of squared differences to the mean
+        self.min = None
+        self.max = None
+        self.lo = None
+        self.width = None
+        self.counts = numpy.zeros(bins + bins % 2, dtype=numpy.int64)
+
+    def update(self, values):
+        """
+        Adds a chunk of values to the statistics
+        """
+        values = numpy.asarray(values, dtype=float).ravel()
+        if len(values) == 0:
+            return
+
+        # Mean and variance of both parts merged (Chan et al.)
+        n = len(values)
+        mean = values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += m2 + delta ** 2 * self.n * n / total
+        self.n = total
+
+        v_min = values.min()
+        v_max = values.max()
+        if self.min is None:
+            self.min = v_min
+            self.max = v_max
+            bins = len(self.counts)
+            self.lo = v_min
+            if v_max > v_min:
+                self.width = (v_max - v_min) / (bins - 1)
+            else:
+                self.width = 1e-9 * max(1.0, abs(v_min))
+        else:
+            self.min = min(self.min, v_min)
+            self.max = max(self.max, v_max)
+
+        # Histogram
+        self._cover(v_min, v_max)
+        index = numpy.floor((values - self.lo) / self.width).astype(int)
+        index = numpy.clip(index, 0, len(self.counts) - 1)
+        self.counts += numpy.bincount(index, minlength=len(self.counts))
+
+    def _cover(self, v_min, v_max):
+        """
+        Doubles the width of histogram bins until [v_min, v_max] is inside its range
+        """
+        bins = len(self.counts)
+        while v_max >= self.lo + self.width * bins:
+            # Grow upwards: merged bins on the lower half
+            merged = self.counts.reshape(-1, 2).sum(axis=1)
+            self.counts = numpy.concatenate((merged, numpy.zeros(bins // 2, dtype=numpy.int64)))
+            self.width *= 2
+        while v_min < self.lo:
+            # Grow downwards: merged bins on the upper half
+            merged = self.counts.reshape(-1, 2).sum(axis=1)
+            self.counts = numpy.concatenate((numpy.zeros(bins // 2, dtype=numpy.int64), merged))
+            self.lo -= self.width * bins
+            self.width *= 2
+
+    def variance(self):
+        """
+        Population variance of the values seen (as numpy.var)
+        """
+        if self.n == 0:
+            return None
+        return self._m2 / self.n
+
+    def std(self):
+        """
+        Population standard deviation of the values seen (as numpy.std)
+        """
+        if self.n == 0:
+            return None
+        return math.sqrt(self.variance())
+
+    def histogram(self):
+        """
+        return: (counts, edges) as numpy.histogram, trimmed to the bins in use
+        """
+        used = numpy.nonzero(self.counts)[0]
+        if len(used) == 0:
+            return self.counts[:0], numpy.array([])
+        first, last = used[0], used[-1] + 1
+        edges = self.lo + self.width * numpy.arange(first, last + 1)
+        return self.counts[first:last].copy(), edges
+
+    def quantile(self, q):
+        """
+        Estimated q-quantile (0 <= q <= 1) interpolating inside histogram bins
+        """
+        if self.n == 0:
+            return None
+        cumulative = numpy.cumsum(self.counts)
+        target = q * self.n
+        b = min(int(numpy.searchsorted(cumulative, target)), len(self.counts) - 1)
+        before = cumulative[b - 1] if b > 0 else 0
+        fraction = (target - before) / float(self.counts[b]) if self.counts[b] else 0.0
+        value = self.lo + self.width * (b + fraction)
+        return min(max(value, self.min), self.max)
+
 
 # --- Start running as a program
 if __name__ == '__main__':
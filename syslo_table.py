@@ -16,41 +16,76 @@ def syslo(temp, pert_graph, alt):
     """
 
     # Step 0.1. Topological Sorting
-    setfamily = []
+    # Every activity is moved right after each activity whose successors are a
+    # proper superset of its own. The family is a linked list (node: next node)
+    # and supersets are found with the activities having each successor
+    setfamily = sorted(temp, key = lambda k: len(temp[k]), reverse = True)
+    head = object()
+    after = dict(zip([head] + setfamily, setfamily + [None]))
+    before = dict(zip(setfamily, [head] + setfamily))
 
-    for k in sorted(temp, key = lambda k: len(temp[k]), reverse = True):
-        setfamily.append(k)
+    succ_sets = {}
+    having = {}
+    position = {}
+    for k, v in temp.items():
+        succ_sets[k] = set(v)
+        position[k] = len(position)
+        for t in succ_sets[k]:
+            having.setdefault(t, set()).add(k)
 
     for k, v in temp.items():
-        for k2, v2 in temp.items():
-            if k != k2 and set(v).issubset(set(v2)) and len(v) < len(v2):
-                setfamily.remove(k)
-                setfamily.insert(setfamily.index(k2), k)
-                setfamily.remove(k2)
-                setfamily.insert(setfamily.index(k), k2)
-                
-                
+        if succ_sets[k]:
+            groups = sorted([having[t] for t in succ_sets[k]], key = len)
+            supersets = groups[0].intersection(*groups[1:])
+        else:
+            supersets = temp
+        for k2 in sorted(supersets, key = position.get):
+            if k != k2 and len(v) < len(temp[k2]):
+                # Unlink k and link it after k2
+                after[before[k]] = after[k]
+                if after[k] is not None:
+                    before[after[k]] = before[k]
+                after[k] = after[k2]
+                if after[k2] is not None:
+                    before[after[k2]] = k
+                after[k2] = k
+                before[k] = k2
+
+    setfamily = []
+    k = after[head]
+    while k is not None:
+        setfamily.append(k)
+        k = after[k]
+
+
     # Step 0.2. Save Prelations In A Work Table Group By Same Successors
     work_sorted_table = {}
     imp_cover = []
     s = 0
-    visited = []
+    visited = set()
+    same_successors = {} # tuple of successors: rows with those successors
 
     for g in setfamily:
         imp_cover = [g]
-        for q, c in work_sorted_table.items():
-            if c.w == temp[g] and g not in c.u:
+        for q in same_successors.get(tuple(temp[g]), []):
+            c = work_sorted_table[q]
+            if g not in c.u:
                 imp_cover = c.u
                 imp_cover.append(g)
         s += 1
         work_sorted_table[s] = Family(imp_cover, temp[g], [], [])
+        same_successors.setdefault(tuple(temp[g]), []).append(s)
 
     # Remove Redundancy
+    same_cover = {} # tuple of activities: rows with those activities
     for act, suc in work_sorted_table.items():
-        for act2, suc2 in work_sorted_table.items():
-            if suc.u == suc2.u and act != act2 and act2 not in visited:
+        same_cover.setdefault(tuple(suc.u), []).append(act)
+
+    for act, suc in work_sorted_table.items():
+        for act2 in same_cover[tuple(suc.u)]:
+            if act != act2 and act2 not in visited and act2 in work_sorted_table:
                 del work_sorted_table[act2]
-                visited.append(act)
+                visited.add(act)
                 break
             
             